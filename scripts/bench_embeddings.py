@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""Benchmark embedding backends: fp32 (torch) vs onnx-int8.
+
+Each backend runs in its own subprocess so load time and peak RSS are
+isolated.  Reports load time, single/batch encode latency, peak RSS, and
+retrieval agreement of int8 against fp32 on a fixed Korean corpus.
+
+Usage (inside the bot container):
+    python scripts/bench_embeddings.py [--backends torch,onnx-int8] [--runs 30]
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Repo checkout: <root>/src ; bot image: src/ is copied to /app next to scripts/
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(_ROOT, 'src') if os.path.isdir(os.path.join(_ROOT, 'src')) else _ROOT
+
+CORPUS = [
+    '제리는 매일 아침 7시에 일어나서 조깅을 한다.',
+    '제리는 아메리카노보다 라떼를 더 좋아한다.',
+    '다음주 수요일 오후 3시에 팀 회의가 잡혀 있다.',
+    '회의실 와이파이 비밀번호는 jarvis2024이다.',
+    '제리의 생일은 3월 15일이다.',
+    '어머니 병원 예약은 금요일 오전 10시로 변경되었다.',
+    '분기 보고서 마감은 이번 달 말일이다.',
+    '제리는 매운 음식을 잘 못 먹는다.',
+    '주말마다 한강에서 자전거를 탄다.',
+    '엔비디아 주가가 어제 5% 상승했다.',
+    '서울 내일 날씨는 흐리고 오후에 비가 올 예정이다.',
+    '제주도 여행 항공권은 다음달 12일 출발로 예매했다.',
+    '가셍 레스토랑 예약은 토요일 저녁 7시다.',
+    '프로젝트 저장소는 깃허브의 pydantic 조직 아래에 있다.',
+    '제리의 차량 번호는 12가 3456이다.',
+    '헬스장 PT는 화요일과 목요일 저녁 8시다.',
+    '동생 결혼식은 5월 둘째 주 일요일이다.',
+    '노트북 충전기는 회사 서랍에 두고 왔다.',
+    '이번 주 금요일까지 세금 신고를 끝내야 한다.',
+    '제리는 재즈 음악을 들으며 코딩하는 것을 좋아한다.',
+    '매월 25일에 월세가 자동이체된다.',
+    '고양이 사료가 거의 다 떨어졌다.',
+    '영어 회화 수업은 월요일 아침 8시에 온라인으로 진행된다.',
+    '제리는 커피를 하루 두 잔 이상 마시지 않으려고 한다.',
+]
+
+QUERIES = [
+    '제리 생일 언제야?',
+    '와이파이 비번 뭐였지?',
+    '이번 주 운동 일정 알려줘',
+    '제리가 좋아하는 커피는?',
+    '내일 비 와?',
+    '여행 비행기 언제 출발해?',
+    '식당 예약 몇 시야?',
+    '마감이 다가오는 일 있어?',
+]
+
+BATCH_SIZE = 16
+TOP_K = 3
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run_worker(backend: str, runs: int, out: str) -> None:
+    """Child: load one backend, time it, dump embeddings + stats."""
+    os.environ['EMBEDDING_BACKEND'] = backend
+    sys.path.insert(0, SRC_DIR)
+    from memory.embeddings import _embed_sync, _load_model
+
+    start = time.perf_counter()
+    _load_model(backend)
+    load_s = time.perf_counter() - start
+
+    _embed_sync(['워밍업'], backend)
+
+    single = []
+    for i in range(runs):
+        t = time.perf_counter()
+        _embed_sync([QUERIES[i % len(QUERIES)]], backend)
+        single.append((time.perf_counter() - t) * 1000)
+
+    batch = []
+    for _ in range(max(3, runs // 5)):
+        t = time.perf_counter()
+        _embed_sync(CORPUS[:BATCH_SIZE], backend)
+        batch.append((time.perf_counter() - t) * 1000)
+
+    docs = _embed_sync(CORPUS, backend)
+    queries = _embed_sync(QUERIES, backend)
+    np.savez(out, docs=docs, queries=queries)
+
+    stats = {
+        'backend': backend,
+        'load_s': load_s,
+        'single_p50_ms': statistics.median(single),
+        'single_p95_ms': _percentile(single, 95),
+        f'batch{BATCH_SIZE}_p50_ms': statistics.median(batch),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    print(json.dumps(stats))
+
+
+def agreement(ref: dict[str, np.ndarray], other: dict[str, np.ndarray]) -> dict:
+    """Compare int8 vs fp32 vectors and top-k retrieval results."""
+    cos_docs = np.sum(ref['docs'] * other['docs'], axis=1)
+    ref_rank = np.argsort(-(ref['queries'] @ ref['docs'].T), axis=1)[:, :TOP_K]
+    other_rank = np.argsort(-(other['queries'] @ other['docs'].T), axis=1)[:, :TOP_K]
+    overlap = [len(set(a) & set(b)) / TOP_K for a, b in zip(ref_rank, other_rank)]
+    return {
+        'mean_cosine_vs_fp32': float(cos_docs.mean()),
+        'min_cosine_vs_fp32': float(cos_docs.min()),
+        'top1_agreement': float(np.mean(ref_rank[:, 0] == other_rank[:, 0])),
+        f'top{TOP_K}_overlap': float(np.mean(overlap)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default='torch,onnx-int8')
+    parser.add_argument('--runs', type=int, default=30)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.runs, args.out)
+        return
+
+    results = {}
+    vectors = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends.split(','):
+            out = os.path.join(tmp, f'{backend}.npz')
+            proc = subprocess.run(
+                [sys.executable, __file__, '--worker', backend, '--runs', str(args.runs), '--out', out],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(f'[{backend}] failed:\n{proc.stderr}', file=sys.stderr)
+                continue
+            results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+            vectors[backend] = dict(np.load(out))
+
+    for backend, stats in results.items():
+        if 'torch' in vectors and backend != 'torch':
+            stats.update(agreement(vectors['torch'], vectors[backend]))
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
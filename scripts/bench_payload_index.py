@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""Benchmark filtered vector search with and without payload indexes.
+
+Fills a scratch collection with random vectors whose payloads look like the
+bot's (chat_id, active, category, timestamp), then times the filtered
+queries the bot runs — conversation search by chat_id, memo search by
+chat_id + active, memo listing via scroll — before and after creating the
+payload indexes that memory.qdrant_store.ensure_collections sets up.
+
+Needs a real Qdrant server (local mode ignores payload indexes).
+
+Usage (inside the bot container):
+    python scripts/bench_payload_index.py [--points 100000] [--chats 500] [--dim 1024]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    Batch,
+    CollectionStatus,
+    Distance,
+    FieldCondition,
+    Filter,
+    MatchValue,
+    PayloadSchemaType,
+    VectorParams,
+)
+
+QDRANT_URL = os.getenv('QDRANT_URL', 'http://qdrant:6333')
+COLLECTION = 'bench_payload_index'
+UPLOAD_BATCH = 1000
+
+INDEXES = {
+    'chat_id': PayloadSchemaType.INTEGER,
+    'active': PayloadSchemaType.BOOL,
+    'category': PayloadSchemaType.KEYWORD,
+    'timestamp': PayloadSchemaType.DATETIME,
+}
+CATEGORIES = ['memo', 'todo', 'idea', 'contact', 'preference', 'habit', 'fact', 'relationship']
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _unit(rng: np.random.Generator, n: int, dim: int) -> np.ndarray:
+    v = rng.standard_normal((n, dim), dtype=np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _wait_green(client: QdrantClient) -> None:
+    while client.get_collection(COLLECTION).status != CollectionStatus.GREEN:
+        time.sleep(0.5)
+
+
+def fill(client: QdrantClient, rng: np.random.Generator, points: int, chats: int, dim: int) -> None:
+    client.create_collection(COLLECTION, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+    now = datetime.now(timezone.utc)
+    for start in range(0, points, UPLOAD_BATCH):
+        n = min(UPLOAD_BATCH, points - start)
+        client.upsert(
+            COLLECTION,
+            points=Batch(
+                ids=[str(uuid.uuid4()) for _ in range(n)],
+                vectors=_unit(rng, n, dim).tolist(),
+                payloads=[
+                    {
+                        'chat_id': int(rng.integers(chats)),
+                        'active': bool(rng.random() < 0.8),
+                        'category': CATEGORIES[int(rng.integers(len(CATEGORIES)))],
+                        'timestamp': (now - timedelta(minutes=int(rng.integers(525600)))).isoformat(),
+                    }
+                    for _ in range(n)
+                ],
+            ),
+            wait=True,
+        )
+    _wait_green(client)
+
+
+def measure(client: QdrantClient, rng: np.random.Generator, chats: int, dim: int, runs: int) -> dict:
+    queries = _unit(rng, runs, dim)
+    chat_ids = rng.integers(chats, size=runs)
+    timings: dict[str, list[float]] = {'search_chat': [], 'search_chat_active': [], 'scroll_chat_active': []}
+    for vector, chat_id in zip(queries, chat_ids):
+        by_chat = FieldCondition(key='chat_id', match=MatchValue(value=int(chat_id)))
+        active = FieldCondition(key='active', match=MatchValue(value=True))
+
+        t = time.perf_counter()
+        client.query_points(COLLECTION, query=vector.tolist(), query_filter=Filter(must=[by_chat]), limit=3)
+        timings['search_chat'].append((time.perf_counter() - t) * 1000)
+
+        t = time.perf_counter()
+        client.query_points(COLLECTION, query=vector.tolist(), query_filter=Filter(must=[by_chat, active]), limit=5)
+        timings['search_chat_active'].append((time.perf_counter() - t) * 1000)
+
+        t = time.perf_counter()
+        client.scroll(COLLECTION, scroll_filter=Filter(must=[by_chat, active]), limit=100, with_vectors=False)
+        timings['scroll_chat_active'].append((time.perf_counter() - t) * 1000)
+
+    return {
+        name: {'p50_ms': round(statistics.median(v), 2), 'p95_ms': round(_percentile(v, 95), 2)}
+        for name, v in timings.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=100_000)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch collection')
+    args = parser.parse_args()
+
+    client = QdrantClient(url=QDRANT_URL, timeout=300)
+    rng = np.random.default_rng(0)
+    if client.collection_exists(COLLECTION):
+        client.delete_collection(COLLECTION)
+
+    try:
+        start = time.perf_counter()
+        fill(client, rng, args.points, args.chats, args.dim)
+        fill_s = time.perf_counter() - start
+
+        measure(client, rng, args.chats, args.dim, 20)  # warm-up
+        before = measure(client, rng, args.chats, args.dim, args.runs)
+
+        start = time.perf_counter()
+        for field, field_type in INDEXES.items():
+            client.create_payload_index(COLLECTION, field, field_schema=field_type, wait=True)
+        _wait_green(client)
+        index_s = time.perf_counter() - start
+
+        measure(client, rng, args.chats, args.dim, 20)
+        after = measure(client, rng, args.chats, args.dim, args.runs)
+    finally:
+        if not args.keep and client.collection_exists(COLLECTION):
+            client.delete_collection(COLLECTION)
+
+    report = {
+        'points': args.points,
+        'chats': args.chats,
+        'dim': args.dim,
+        'fill_s': round(fill_s, 1),
+        'index_build_s': round(index_s, 1),
+        'before': before,
+        'after': after,
+        'speedup_p50': {name: round(before[name]['p50_ms'] / after[name]['p50_ms'], 1) for name in before},
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""One-off migration: compress existing large payload fields in place.
+
+Rewrites plain-string history JSON (history_snapshots / history_log) and
+conversation texts that are at least PAYLOAD_COMPRESS_MIN_BYTES long into the
+compressed encoding of memory.compression — in Qdrant, and in the SQLite
+state database when STATE_STORE=sqlite.  Already-compressed and small values
+are left alone, so the script can be re-run safely.
+
+Reports bytes before/after, the compression ratio, and the time of a full
+history restore before and after the migration.
+
+Usage (inside the bot container):
+    python scripts/migrate_compress_payloads.py [--dry-run]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Repo checkout: <root>/src ; bot image: src/ is copied to /app next to scripts/
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(_ROOT, 'src') if os.path.isdir(os.path.join(_ROOT, 'src')) else _ROOT
+sys.path.insert(0, SRC_DIR)
+
+from qdrant_client.http.models import SetPayload, SetPayloadOperation  # noqa: E402
+
+from memory import qdrant_store as qs  # noqa: E402
+from memory.compression import CODEC, pack, to_blob  # noqa: E402
+from memory.state_store import STATE_DB_PATH, STATE_STORE, get_store  # noqa: E402
+
+QDRANT_FIELDS = {
+    qs.HISTORY_SNAPSHOTS: ('messages_json',),
+    qs.HISTORY_LOG: ('messages_json',),
+    qs.CONVERSATIONS: ('user_text', 'assistant_text'),
+}
+SQLITE_TABLES = {
+    'history_snapshots': ('chat_id',),
+    'history_log': ('chat_id', 'seq'),
+}
+
+
+def _packed_size(value) -> int:
+    return len(json.dumps(value)) if isinstance(value, dict) else len(value.encode())
+
+
+async def migrate_qdrant(collection: str, fields: tuple[str, ...], dry_run: bool) -> dict:
+    client = qs.get_client()
+    stats = {'points': 0, 'fields': 0, 'bytes_before': 0, 'bytes_after': 0}
+    offset = None
+    while True:
+        points, offset = await client.scroll(
+            collection_name=collection, limit=qs.SCROLL_PAGE_SIZE, offset=offset, with_vectors=False,
+        )
+        ops = []
+        for point in points:
+            stats['points'] += 1
+            update = {}
+            for field in fields:
+                value = point.payload.get(field)
+                if not isinstance(value, str):
+                    continue
+                packed = pack(value)
+                if isinstance(packed, dict):
+                    update[field] = packed
+                    stats['fields'] += 1
+                    stats['bytes_before'] += len(value.encode())
+                    stats['bytes_after'] += _packed_size(packed)
+            if update:
+                ops.append(SetPayloadOperation(set_payload=SetPayload(payload=update, points=[point.id])))
+        if ops and not dry_run:
+            await client.batch_update_points(collection_name=collection, update_operations=ops)
+        if offset is None:
+            return stats
+
+
+def migrate_sqlite(path: str, dry_run: bool) -> dict:
+    conn = sqlite3.connect(path)
+    stats = {'rows': 0, 'bytes_before': 0, 'bytes_after': 0}
+    with conn:
+        for table, keys in SQLITE_TABLES.items():
+            cols = ', '.join(keys)
+            rows = conn.execute(
+                f"SELECT {cols}, messages_json FROM {table} WHERE typeof(messages_json) = 'text'"
+            ).fetchall()
+            for *key, text in rows:
+                blob = to_blob(text)
+                if not isinstance(blob, bytes):
+                    continue
+                stats['rows'] += 1
+                stats['bytes_before'] += len(text.encode())
+                stats['bytes_after'] += len(blob)
+                if not dry_run:
+                    where = ' AND '.join(f'{k} = ?' for k in keys)
+                    conn.execute(f'UPDATE {table} SET messages_json = ? WHERE {where}', (blob, *key))
+    if not dry_run and stats['rows']:
+        conn.execute('VACUUM')  # give the freed pages back to the filesystem
+    conn.close()
+    return stats
+
+
+async def time_restore() -> dict:
+    from memory.manager import restore_histories
+
+    start = time.perf_counter()
+    restored = await restore_histories()
+    return {'chats': len(restored), 'seconds': round(time.perf_counter() - start, 3)}
+
+
+def _ratio(stats: dict) -> float:
+    return round(stats['bytes_before'] / stats['bytes_after'], 2) if stats['bytes_after'] else 1.0
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='measure only, write nothing')
+    args = parser.parse_args()
+
+    if CODEC == 'off':
+        sys.exit('PAYLOAD_COMPRESSION=off — nothing to do')
+
+    sqlite_path = STATE_DB_PATH if STATE_STORE == 'sqlite' and os.path.exists(STATE_DB_PATH) else None
+    await get_store().init()
+
+    report: dict = {'codec': CODEC, 'dry_run': args.dry_run, 'restore_before': await time_restore()}
+
+    existing = {c.name for c in (await qs.get_client().get_collections()).collections}
+    for collection, fields in QDRANT_FIELDS.items():
+        if collection in existing:
+            stats = await migrate_qdrant(collection, fields, args.dry_run)
+            report[f'qdrant.{collection}'] = {**stats, 'ratio': _ratio(stats)}
+
+    if sqlite_path is not None:
+        # The store's own connection is idle here; WAL lets this one write alongside it
+        stats = await asyncio.to_thread(migrate_sqlite, sqlite_path, args.dry_run)
+        report['sqlite'] = {**stats, 'ratio': _ratio(stats)}
+
+    report['restore_after'] = await time_restore()
+    await get_store().close()
+    await qs.close_client()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,15 +1,19 @@
 """PydanticAI agent configuration."""
 
 import os
+import re
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta, timezone
 
-from pydantic_ai import Agent
-from pydantic_ai.messages import ModelMessage
+from pydantic_ai import Agent, RunContext
+from pydantic_ai.messages import ModelMessage, ModelRequest, SystemPromptPart, UserPromptPart
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.profiles import InlineDefsJsonSchemaTransformer
 from pydantic_ai.profiles.openai import OpenAIModelProfile
 from pydantic_ai.providers.openai import OpenAIProvider
 
+from history import token_budget
+
 VLLM_BASE_URL = os.getenv('VLLM_BASE_URL', 'http://vllm:8000/v1')
 VLLM_MODEL = os.getenv('VLLM_MODEL', 'Qwen/Qwen3-32B')
 SYSTEM_PROMPT = os.getenv(
@@ -29,6 +33,88 @@ SYSTEM_PROMPT = os.getenv(
     '중요: 사용자가 알려준 이름, 고유명사의 철자를 절대 바꾸지 마라. 한 글자도 수정하지 마라. 사용자 메시지에 적힌 글자를 그대로 복사해서 사용해라. 예를 들어 "가셍"을 "가성"이나 "가싱"으로 바꾸면 안 된다.',
 )
 
+
+@dataclass
+class ChatDeps:
+    """Per-run dependencies — each agent.run() gets its own, so concurrent runs stay isolated."""
+
+    chat_id: int
+    memory_context: str = ''  # retrieved memories for this turn
+
+
+WEEKDAYS = ['월', '화', '수', '목', '금', '토', '일']
+
+KST = timezone(timedelta(hours=9))
+
+# Marks the per-turn context part so it can be found (and dropped) in later turns
+VOLATILE_REF = 'volatile_context'
+
+
+def _volatile_text(deps: ChatDeps) -> str:
+    now = datetime.now(KST)
+    wd = WEEKDAYS[now.weekday()]
+    text = f'현재: {now.strftime("%Y-%m-%d %H:%M")} ({wd}요일)'
+    return f'{text}\n\n{deps.memory_context}' if deps.memory_context else text
+
+
+# Parts persisted by the former dynamic_date / memory_prompt system prompts:
+# tagged with those dynamic_refs, or as plain untagged parts in older histories
+LEGACY_REFS = frozenset({'dynamic_date', 'memory_prompt'})
+_LEGACY_DATE = re.compile(r'현재: \d{4}-\d{2}-\d{2} \d{2}:\d{2} \(.요일\)')
+_LEGACY_MEMORY_HEADERS = ('=== 제리에 대해 알고 있는 것 ===', '=== 제리가 저장한 메모 ===', '=== 관련 과거 대화 ===')
+
+
+def _is_volatile(part) -> bool:
+    return isinstance(part, SystemPromptPart) and part.dynamic_ref == VOLATILE_REF
+
+
+def _is_legacy(part) -> bool:
+    if not isinstance(part, SystemPromptPart):
+        return False
+    if part.dynamic_ref in LEGACY_REFS:
+        return True
+    if part.dynamic_ref is not None:
+        return False
+    content = part.content.strip()
+    return not content or bool(_LEGACY_DATE.fullmatch(content)) or content.startswith(_LEGACY_MEMORY_HEADERS)
+
+
+def volatile_context(ctx: RunContext[ChatDeps], messages: list[ModelMessage]) -> list[ModelMessage]:
+    """Put the per-turn context (date, retrieved memories) right before the current user prompt.
+
+    vLLM's prefix cache only reuses a byte-identical prompt prefix.  Keeping the
+    system prompt, tools and earlier turns unchanged across turns — and the
+    context that changes with every message at the tail, dropped again from
+    older turns — lets the cache cover everything up to the previous turn's
+    request.  That request changes (its context part is dropped), so each turn
+    prefills the previous turn plus the new one instead of the whole history.
+    Date/memory parts left in older histories by the former system prompts
+    are dropped as well.
+    """
+    current = next(
+        (
+            i for i in range(len(messages) - 1, -1, -1)
+            if isinstance(messages[i], ModelRequest) and any(isinstance(p, UserPromptPart) for p in messages[i].parts)
+        ),
+        None,
+    )
+    out = []
+    for i, msg in enumerate(messages):
+        if isinstance(msg, ModelRequest):
+            if any(_is_legacy(p) for p in msg.parts):
+                msg = replace(msg, parts=[p for p in msg.parts if not _is_legacy(p)])
+            if i == current:
+                # Tool-loop requests of the same run keep the part added by the first one
+                if not any(_is_volatile(p) for p in msg.parts):
+                    at = next(j for j, p in enumerate(msg.parts) if isinstance(p, UserPromptPart))
+                    part = SystemPromptPart(_volatile_text(ctx.deps), dynamic_ref=VOLATILE_REF)
+                    msg = replace(msg, parts=[*msg.parts[:at], part, *msg.parts[at:]])
+            elif any(_is_volatile(p) for p in msg.parts):
+                msg = replace(msg, parts=[p for p in msg.parts if not _is_volatile(p)])
+        out.append(msg)
+    return out
+
+
 model = OpenAIChatModel(
     VLLM_MODEL,
     provider=OpenAIProvider(base_url=VLLM_BASE_URL, api_key='dummy'),
@@ -40,45 +126,12 @@ model = OpenAIChatModel(
 )
 
 
-def sliding_window(messages: list[ModelMessage]) -> list[ModelMessage]:
-    """Keep only the most recent 20 messages. Preserve the first 2 (system context)."""
-    if len(messages) <= 20:
-        return messages
-    return messages[:2] + messages[-18:]
-
-
 agent = Agent(
     model,
-    deps_type=int,  # chat_id
+    deps_type=ChatDeps,
     system_prompt=SYSTEM_PROMPT,
     model_settings={
         'extra_body': {'chat_template_kwargs': {'enable_thinking': False}},
     },
-    history_processors=[sliding_window],
+    history_processors=[volatile_context, token_budget],
 )
-
-# Per-request memory context injected by bot.py before agent.run()
-_memory_context: str = ''
-
-
-def set_memory_context(ctx: str) -> None:
-    global _memory_context
-    _memory_context = ctx
-
-
-WEEKDAYS = ['월', '화', '수', '목', '금', '토', '일']
-
-
-KST = timezone(timedelta(hours=9))
-
-
-@agent.system_prompt
-def dynamic_date() -> str:
-    now = datetime.now(KST)
-    wd = WEEKDAYS[now.weekday()]
-    return f'현재: {now.strftime("%Y-%m-%d %H:%M")} ({wd}요일)'
-
-
-@agent.system_prompt
-def memory_prompt() -> str:
-    return _memory_context
@@ -3,11 +3,13 @@
 Uses agent.run() instead of run_stream() because run_stream() stops executing
 tool calls when the model also produces text content (e.g. <think> tags).
 agent.run() always runs the full agent graph including all tool calls.
+REPLY_MODE=stream walks the same graph with agent.iter() and edits the reply
+as it is generated (see streaming.py).
 """
 
+import asyncio
 import logging
 import os
-from collections import defaultdict
 
 from telegram import Update
 from telegram.constants import ParseMode
@@ -19,10 +21,14 @@ from telegram.ext import (
     filters,
 )
 
-from agent import agent, set_memory_context  # noqa: F401 — must import before tools
+from agent import ChatDeps, agent  # noqa: F401 — must import before tools
 import tools  # noqa: F401 — registers tools on agent
+from chat_queue import get_chat_queue
 from format import md_to_html, strip_markdown, strip_think
-from pydantic_ai.messages import ModelMessage
+from metrics import register_stats, schedule_stats_refresh, start_metrics_server, timed
+from streaming import REPLY_MODE, StreamingReply, run_streamed
+from usage_stats import get_usage_stats
+from memory.history_cache import HISTORY_CACHE_MAX_CHATS, HISTORY_CACHE_MAX_MB, HistoryCache
 
 logging.basicConfig(
     format='%(asctime)s [%(name)s] %(levelname)s: %(message)s',
@@ -32,13 +38,18 @@ logger = logging.getLogger(__name__)
 
 TELEGRAM_BOT_TOKEN = os.environ['TELEGRAM_BOT_TOKEN']
 ALLOWED_CHAT_IDS = os.getenv('ALLOWED_CHAT_IDS', '')
+# How long a message waits for the embedding model warm-up before skipping retrieval
+EMBEDDING_READY_WAIT = float(os.getenv('EMBEDDING_READY_WAIT', '2'))
 
-# Per-chat conversation history
-chat_histories: dict[int, list[ModelMessage]] = defaultdict(list)
+# Per-chat conversation history (bounded; cold chats spill to the state store)
+chat_histories = HistoryCache(HISTORY_CACHE_MAX_CHATS, int(HISTORY_CACHE_MAX_MB * 1e6))
 
 # Memory system availability flag
 _memory_ready = False
 
+# Background embedding warm-up (kept referenced so it isn't garbage collected)
+_warmup_task: asyncio.Task | None = None
+
 
 def is_allowed(chat_id: int) -> bool:
     if not ALLOWED_CHAT_IDS:
@@ -48,43 +59,104 @@ def is_allowed(chat_id: int) -> bool:
 
 
 async def post_init(app: Application) -> None:
-    """Initialize Qdrant + restore histories and alarms after bot starts."""
-    global _memory_ready
+    """Initialize Qdrant + state store, restore histories and alarms after bot starts."""
+    global _memory_ready, _warmup_task
 
     try:
-        from memory import qdrant_store as qs
-        from memory.manager import restore_histories
+        from memory import embeddings, qdrant_store as qs
+        from memory.manager import HISTORY_RESTORE, load_history, restore_histories
+        from memory.state_store import STATE_STORE, get_store
         from memory.alarms import restore_alarms
         from memory.briefing import restore_briefings
+        from memory.writer import get_writer
         from tools.alarm import set_job_queue
         from tools.briefing import set_job_queue as set_briefing_job_queue
 
-        qs.ensure_collections()
+        # Load + warm the embedding model while the rest of startup runs
+        _warmup_task = asyncio.create_task(embeddings.warm_up())
+
+        await qs.ensure_collections(state_collections=STATE_STORE == 'qdrant')
         logger.info('Qdrant collections ready')
 
-        # Restore chat histories
-        restored = restore_histories()
-        for chat_id, messages in restored.items():
-            chat_histories[chat_id] = messages
-        logger.info('Restored %d chat histories', len(restored))
+        await get_store().init()
+
+        # Restore chat histories (lazy mode loads them on each chat's first message)
+        writer = get_writer()
+        chat_histories.attach(load_history, writer.persist_history, writer.busy)
+        if HISTORY_RESTORE == 'eager':
+            restored = await restore_histories(limit=chat_histories.max_chats)
+            for chat_id, messages in restored.items():
+                if not chat_histories.preload(chat_id, messages):
+                    break
+            logger.info('History cache: %s', chat_histories.stats())
 
         # Set job queue for alarm and briefing tools
         set_job_queue(app.job_queue)
         set_briefing_job_queue(app.job_queue)
 
         # Restore alarms
-        count = restore_alarms(app.job_queue)
+        count = await restore_alarms(app.job_queue)
         logger.info('Restored %d alarms', count)
 
         # Restore briefings
-        briefing_count = restore_briefings(app.job_queue)
+        briefing_count = await restore_briefings(app.job_queue)
         logger.info('Restored %d briefings', briefing_count)
 
+        # Retention for the conversations collection
+        from memory.maintenance import schedule_maintenance
+
+        schedule_maintenance(app.job_queue)
+
+        writer.start()
+
         _memory_ready = True
         logger.info('Memory system initialized')
+
+        register_stats('history_cache', chat_histories.stats)
+        register_stats('memory_writer', writer.stats)
+        register_stats('embedding_cache', embeddings.cache_stats)
+        register_stats('embedding_batches', embeddings.batch_stats)
+        register_stats('qdrant_writes', qs.write_stats)
     except Exception:
         logger.error('Memory system init failed — running without memory', exc_info=True)
 
+    from memory.summarizer import get_summarizer
+
+    register_stats('chat_queue', get_chat_queue().stats)
+    register_stats('prompt_usage', get_usage_stats().stats)
+    register_stats('summarizer', get_summarizer().stats)
+    schedule_stats_refresh(app.job_queue)
+    try:
+        start_metrics_server()
+    except OSError:
+        logger.error('Metrics endpoint failed to start', exc_info=True)
+
+
+async def post_shutdown(app: Application) -> None:
+    """Persist the embedding cache, stop the encoder worker, release Qdrant connections."""
+    from memory.summarizer import get_summarizer
+
+    logger.info('Chat queue: %s', get_chat_queue().stats())
+    logger.info('Prompt usage: %s', get_usage_stats().stats())
+    await get_summarizer().stop()
+    logger.info('Summarizer: %s', get_summarizer().stats())
+    if not _memory_ready:
+        return
+    from memory import embeddings, qdrant_store as qs
+    from memory.state_store import get_store
+    from memory.writer import MEMORY_WRITE_DRAIN_TIMEOUT, get_writer
+
+    # Drain pending memory writes while embeddings + Qdrant are still up
+    await chat_histories.flush()
+    logger.info('History cache: %s', chat_histories.stats())
+    await get_writer().stop(MEMORY_WRITE_DRAIN_TIMEOUT)
+    logger.info('Embedding cache: %s', embeddings.cache_stats())
+    logger.info('Embedding batches: %s', embeddings.batch_stats())
+    embeddings.shutdown()
+    await get_store().close()
+    await qs.close_client()
+    logger.info('Qdrant write buffer: %s', qs.write_stats())
+
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text('안녕하세요! 자비스입니다. 무엇을 도와드릴까요?')
@@ -92,64 +164,101 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def cmd_reset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.effective_chat.id
-    chat_histories[chat_id] = []
+    # Wait for an in-flight turn, or it would write the old history back afterwards
+    async with get_chat_queue().chat(chat_id):
+        chat_histories[chat_id] = []
     await update.message.reply_text('대화 기록이 초기화되었습니다.')
 
 
+@timed('stage', 'handle_message')
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.effective_chat.id
     if not is_allowed(chat_id):
         return
 
     user_msg = update.message.text
-    history = chat_histories[chat_id]
-
-    await update.effective_chat.send_action('typing')
-
-    try:
-        # Search memory for relevant context
-        if _memory_ready:
-            from memory.manager import get_relevant_context, on_turn_complete
-
-            mem_ctx = await get_relevant_context(chat_id, user_msg)
-            set_memory_context(mem_ctx)
-        else:
-            set_memory_context('')
-
-        result = await agent.run(user_msg, message_history=history, deps=chat_id)
-        text = strip_think(result.output or '')
-        if not text:
-            text = '처리 완료했습니다.'
-
-        formatted = md_to_html(text)
-        plain = strip_markdown(text)
-        if not plain:
-            plain = text
-
-        try:
-            await update.message.reply_text(formatted, parse_mode=ParseMode.HTML)
-        except Exception:
-            logger.warning('HTML send failed, falling back to plain text')
-            await update.message.reply_text(plain)
-
-        chat_histories[chat_id] = list(result.all_messages())
-
-        # Save to memory asynchronously (don't block response)
-        if _memory_ready:
-            import asyncio
-
-            asyncio.create_task(
-                on_turn_complete(chat_id, user_msg, text, chat_histories[chat_id])
-            )
 
-    except Exception as e:
-        logger.error('Error handling message: %s', e, exc_info=True)
-        await update.message.reply_text(f'오류가 발생했습니다: {type(e).__name__}')
+    # Take the chat's place in line before any await, so its messages keep their order
+    queue = get_chat_queue()
+    async with queue.chat(chat_id):
+        await update.effective_chat.send_action('typing')
+
+        reply: StreamingReply | None = None
+        with chat_histories.pin(chat_id):
+            try:
+                with timed('stage', 'load_history'):
+                    history = await chat_histories.load(chat_id)
+
+                # Search memory for relevant context
+                mem_ctx = ''
+                if _memory_ready:
+                    from memory.embeddings import wait_ready
+                    from memory.manager import get_relevant_context
+
+                    with timed('stage', 'retrieval'):
+                        if await wait_ready(EMBEDDING_READY_WAIT):
+                            mem_ctx = await get_relevant_context(chat_id, user_msg)
+                        else:
+                            logger.info('Embedding model still warming up — skipping retrieval for chat %d', chat_id)
+
+                deps = ChatDeps(chat_id, memory_context=mem_ctx)
+                if REPLY_MODE == 'stream':
+                    reply = StreamingReply(update.message)
+                    await reply.start()
+                    async with queue.slot():
+                        with timed('stage', 'agent_run'):
+                            result = await run_streamed(user_msg, history, deps, reply)
+                else:
+                    async with queue.slot():
+                        with timed('stage', 'agent_run'):
+                            result = await agent.run(user_msg, message_history=history, deps=deps)
+                get_usage_stats().record(chat_id, result.usage())
+                text = strip_think(result.output or '')
+                if not text:
+                    text = '처리 완료했습니다.'
+
+                formatted = md_to_html(text)
+                plain = strip_markdown(text)
+                if not plain:
+                    plain = text
+
+                with timed('stage', 'send'):
+                    if reply is not None:
+                        await reply.finish(formatted, plain)
+                    else:
+                        try:
+                            await update.message.reply_text(formatted, parse_mode=ParseMode.HTML)
+                        except Exception:
+                            logger.warning('HTML send failed, falling back to plain text')
+                            await update.message.reply_text(plain)
+
+                chat_histories[chat_id] = list(result.all_messages())
+
+                # Save to memory in the background writer (don't block response)
+                if _memory_ready:
+                    from memory.writer import get_writer
+
+                    await get_writer().submit(chat_id, user_msg, text, chat_histories[chat_id])
+
+                # Fold old turns into a rolling summary once the history gets long
+                from memory.summarizer import get_summarizer
+
+                get_summarizer().maybe_schedule(chat_id, chat_histories)
+
+            except Exception as e:
+                logger.error('Error handling message: %s', e, exc_info=True)
+                error_text = f'오류가 발생했습니다: {type(e).__name__}'
+                if reply is not None:
+                    await reply.finish(error_text, error_text)
+                else:
+                    await update.message.reply_text(error_text)
 
 
 def main() -> None:
-    app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    # Chats are handled in parallel; chat_queue keeps per-chat order and caps agent runs
+    app = Application.builder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(True).build()
     app.post_init = post_init
+    app.post_shutdown = post_shutdown
     app.add_handler(CommandHandler('start', cmd_start))
     app.add_handler(CommandHandler('reset', cmd_reset))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
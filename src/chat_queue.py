@@ -0,0 +1,138 @@
+"""Per-chat message ordering and a global cap on concurrent agent runs.
+
+The Application processes updates concurrently (bot.main), so one chat's long
+tool-heavy turn no longer holds up everyone else.  Two guards remain:
+
+- ``chat(chat_id)``: a FIFO lock per chat — a chat's messages are answered
+  one at a time, in the order they arrived.  Enter it before the handler's
+  first await, or two updates of the same chat can overtake each other.
+- ``slot()``: a semaphore around agent runs, sized like vLLM's
+  ``--max-num-seqs`` (AGENT_MAX_CONCURRENCY), so extra runs wait here in
+  arrival order instead of piling up in vLLM's scheduler.
+
+Time spent waiting on either is recorded; stats() reports percentiles and the
+worst-waiting chats.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from metrics import observe
+
+logger = logging.getLogger(__name__)
+
+AGENT_MAX_CONCURRENCY = int(os.getenv('AGENT_MAX_CONCURRENCY', '4'))
+# Waits longer than this (seconds) are logged with the chat id
+CHAT_WAIT_LOG_S = float(os.getenv('CHAT_WAIT_LOG_S', '5'))
+
+WAIT_SAMPLES = 1000
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summary(samples: deque[float]) -> dict:
+    if not samples:
+        return {'n': 0}
+    ordered = sorted(samples)
+    return {
+        'n': len(ordered),
+        'p50_s': round(_percentile(ordered, 0.5), 3),
+        'p95_s': round(_percentile(ordered, 0.95), 3),
+        'max_s': round(ordered[-1], 3),
+    }
+
+
+class ChatQueue:
+    def __init__(self, max_concurrency: int) -> None:
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._locks: dict[int, asyncio.Lock] = {}
+        # Handlers holding or waiting for each chat's lock; the lock is dropped at 0
+        self._depth: dict[int, int] = {}
+        # Recent waits, for percentiles
+        self._chat_waits: deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._slot_waits: deque[float] = deque(maxlen=WAIT_SAMPLES)
+        # Per-chat totals: chat_id -> [waits, total_s, max_s]
+        self._per_chat: dict[int, list] = {}
+        self.running = 0
+        self.max_depth = 0
+
+    def depth(self, chat_id: int) -> int:
+        return self._depth.get(chat_id, 0)
+
+    @asynccontextmanager
+    async def chat(self, chat_id: int) -> AsyncIterator[float]:
+        """Hold this chat's turn. Yields the seconds spent waiting for it."""
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        depth = self._depth[chat_id] = self._depth.get(chat_id, 0) + 1
+        self.max_depth = max(self.max_depth, depth)
+        start = time.perf_counter()
+        try:
+            async with lock:
+                waited = time.perf_counter() - start
+                self._record(chat_id, waited)
+                if waited >= CHAT_WAIT_LOG_S:
+                    logger.info('Chat %d waited %.1fs behind %d earlier message(s)', chat_id, waited, depth - 1)
+                yield waited
+        finally:
+            self._depth[chat_id] -= 1
+            if not self._depth[chat_id]:
+                del self._depth[chat_id]
+                del self._locks[chat_id]
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """Hold one of the global agent-run slots. Yields the seconds spent waiting."""
+        start = time.perf_counter()
+        async with self._slots:
+            waited = time.perf_counter() - start
+            self._slot_waits.append(waited)
+            observe('stage', 'slot_wait', waited)
+            self.running += 1
+            try:
+                yield waited
+            finally:
+                self.running -= 1
+
+    def _record(self, chat_id: int, waited: float) -> None:
+        self._chat_waits.append(waited)
+        observe('stage', 'chat_wait', waited)
+        entry = self._per_chat.setdefault(chat_id, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += waited
+        entry[2] = max(entry[2], waited)
+
+    def stats(self, top: int = 5) -> dict:
+        worst = sorted(self._per_chat.items(), key=lambda kv: kv[1][2], reverse=True)[:top]
+        return {
+            'max_concurrency': self.max_concurrency,
+            'running': self.running,
+            'active_chats': len(self._locks),
+            'queued': sum(d - 1 for d in self._depth.values()),
+            'max_depth': self.max_depth,
+            'chat_wait': _summary(self._chat_waits),
+            'slot_wait': _summary(self._slot_waits),
+            'worst_chats': {
+                chat_id: {'waits': n, 'avg_s': round(total / n, 3), 'max_s': round(peak, 3)}
+                for chat_id, (n, total, peak) in worst
+            },
+        }
+
+
+_queue: ChatQueue | None = None
+
+
+def get_chat_queue() -> ChatQueue:
+    global _queue
+    if _queue is None:
+        _queue = ChatQueue(AGENT_MAX_CONCURRENCY)
+    return _queue
@@ -20,6 +20,45 @@ def strip_think(text: str) -> str:
     return t.strip()
 
 
+class ThinkFilter:
+    """Incremental strip_think() for streamed text: feed() chunks, get back the visible part.
+
+    A tag split across chunks is held back until the next chunk decides it;
+    text after an unclosed <think> never comes out, matching strip_think().
+    """
+
+    OPEN, CLOSE = '<think>', '</think>'
+
+    def __init__(self) -> None:
+        self._buf = ''
+        self._thinking = False
+
+    def feed(self, chunk: str) -> str:
+        self._buf += chunk
+        out = []
+        while True:
+            tag = self.CLOSE if self._thinking else self.OPEN
+            idx = self._buf.find(tag)
+            if idx < 0:
+                break
+            if not self._thinking:
+                out.append(self._buf[:idx])
+            self._buf = self._buf[idx + len(tag):]
+            self._thinking = not self._thinking
+        # Keep a trailing partial tag ('<thi') for the next chunk
+        keep = next((k for k in range(min(len(tag) - 1, len(self._buf)), 0, -1) if self._buf.endswith(tag[:k])), 0)
+        cut = len(self._buf) - keep
+        if not self._thinking:
+            out.append(self._buf[:cut])
+        self._buf = self._buf[cut:]
+        return ''.join(out)
+
+    def flush(self) -> str:
+        rest = '' if self._thinking else self._buf
+        self._buf = ''
+        return rest
+
+
 def md_to_html(text: str) -> str:
     """Convert Markdown to Telegram-compatible HTML via markdown-it-py."""
     text = strip_think(text)
@@ -0,0 +1,127 @@
+"""Token-budget history processor.
+
+Trims the message history sent to vLLM to HISTORY_TOKEN_BUDGET tokens,
+counted with the served model's tokenizer (falls back to a chars/3 estimate
+if the tokenizer can't be loaded).  Token counts are cached per message
+object, so each turn only tokenizes the messages that are new since the last
+one.
+
+History is only ever cut right before a user prompt, so a tool call and its
+tool return always stay together.  The system prompt parts of the first
+message are carried over onto the first kept message.
+"""
+
+import dataclasses
+import logging
+import os
+import weakref
+from functools import lru_cache
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    RetryPromptPart,
+    SystemPromptPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+logger = logging.getLogger(__name__)
+
+# vLLM serves with --max-model-len 32768; leave room for tool schemas,
+# volatile context and the reply.
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', '16000'))
+HISTORY_TOKENIZER = os.getenv('HISTORY_TOKENIZER', os.getenv('VLLM_MODEL', 'Qwen/Qwen3-32B'))
+
+# Chat template framing per message (<|im_start|>role\n ... <|im_end|>\n)
+MESSAGE_OVERHEAD = 4
+
+# id(message) -> (weakref to message, token count); entries drop when the message dies
+_token_counts: dict[int, tuple[weakref.ref, int]] = {}
+
+
+@lru_cache(maxsize=1)
+def _get_tokenizer():
+    try:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(HISTORY_TOKENIZER)
+        logger.info('History tokenizer loaded: %s', HISTORY_TOKENIZER)
+        return tokenizer
+    except Exception:
+        logger.warning('History tokenizer %s unavailable — estimating tokens', HISTORY_TOKENIZER, exc_info=True)
+        return None
+
+
+def count_text_tokens(text: str) -> int:
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return len(text) // 3 + 1
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def message_text(message: ModelMessage) -> str:
+    chunks = []
+    for part in message.parts:
+        if isinstance(part, ToolCallPart):
+            chunks.append(part.tool_name)
+            chunks.append(part.args_as_json_str())
+        elif isinstance(part, ToolReturnPart):
+            chunks.append(part.model_response_str())
+        elif isinstance(part, RetryPromptPart):
+            chunks.append(part.model_response())
+        else:
+            content = getattr(part, 'content', '')
+            chunks.append(content if isinstance(content, str) else str(content))
+    return '\n'.join(chunks)
+
+
+def count_message_tokens(message: ModelMessage) -> int:
+    """Token count of one message, cached for as long as the message object lives."""
+    key = id(message)
+    cached = _token_counts.get(key)
+    if cached is not None and cached[0]() is message:
+        return cached[1]
+    count = count_text_tokens(message_text(message)) + MESSAGE_OVERHEAD
+    _token_counts[key] = (weakref.ref(message, lambda _, key=key: _token_counts.pop(key, None)), count)
+    return count
+
+
+def _starts_turn(message: ModelMessage) -> bool:
+    return isinstance(message, ModelRequest) and any(isinstance(p, UserPromptPart) for p in message.parts)
+
+
+def token_budget(messages: list[ModelMessage]) -> list[ModelMessage]:
+    """Keep the most recent whole turns that fit in HISTORY_TOKEN_BUDGET.
+
+    The current turn is always kept, even if it alone exceeds the budget.
+    """
+    if len(messages) <= 1:
+        return messages
+
+    head = messages[0]
+    system_parts = [p for p in head.parts if isinstance(p, SystemPromptPart)] if isinstance(head, ModelRequest) else []
+    system_tokens = count_text_tokens('\n'.join(p.content for p in system_parts)) if system_parts else 0
+
+    used = 0
+    cut = None
+    for i in range(len(messages) - 1, -1, -1):
+        used += count_message_tokens(messages[i])
+        if i == 0 or _starts_turn(messages[i]):
+            # Cutting after the head means carrying its system prompt over
+            if cut is not None and used + (system_tokens if i else 0) > HISTORY_TOKEN_BUDGET:
+                break
+            cut = i
+    if not cut:
+        return messages
+
+    kept = messages[cut:]
+    if system_parts:
+        first = kept[0]
+        kept[0] = dataclasses.replace(first, parts=[*system_parts, *first.parts])
+    logger.debug('History trimmed: %d -> %d messages', len(messages), len(kept))
+    return kept
+
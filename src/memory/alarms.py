@@ -1,4 +1,4 @@
-"""Alarm persistence and scheduling via Qdrant + telegram JobQueue."""
+"""Alarm persistence and scheduling via the state store + telegram JobQueue."""
 
 import logging
 import uuid
@@ -6,7 +6,7 @@ from datetime import datetime, timezone
 
 from telegram.ext import ContextTypes
 
-from memory import qdrant_store as qs
+from memory.state_store import get_store
 
 logger = logging.getLogger(__name__)
 
@@ -25,12 +25,12 @@ async def _fire_alarm(context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.info('Alarm fired: %s → chat %d', alarm_id, chat_id)
 
         if not repeat:
-            qs.deactivate_alarm(alarm_id)
+            await get_store().deactivate_alarm(alarm_id)
     except Exception:
         logger.error('Failed to fire alarm %s', alarm_id, exc_info=True)
 
 
-def schedule_alarm(
+async def schedule_alarm(
     job_queue,
     alarm_id: str,
     chat_id: int,
@@ -66,7 +66,7 @@ def schedule_alarm(
         # One-shot alarm
         if fire_at <= now:
             logger.warning('Alarm %s is in the past, skipping', alarm_id)
-            qs.deactivate_alarm(alarm_id)
+            await get_store().deactivate_alarm(alarm_id)
             return
         job_queue.run_once(
             _fire_alarm,
@@ -88,7 +88,7 @@ async def create_alarm(
     """Create and persist a new alarm. Returns alarm_id."""
     alarm_id = str(uuid.uuid4())
 
-    qs.save_alarm(
+    await get_store().save_alarm(
         alarm_id=alarm_id,
         chat_id=chat_id,
         message=message,
@@ -96,26 +96,26 @@ async def create_alarm(
         repeat=repeat,
     )
 
-    schedule_alarm(job_queue, alarm_id, chat_id, message, fire_at, repeat)
+    await schedule_alarm(job_queue, alarm_id, chat_id, message, fire_at, repeat)
     return alarm_id
 
 
-def restore_alarms(job_queue) -> int:
-    """Restore active alarms from Qdrant and re-register in JobQueue."""
+async def restore_alarms(job_queue) -> int:
+    """Restore active alarms from the state store and re-register in JobQueue."""
     count = 0
     try:
-        alarms = qs.load_active_alarms()
-        for alarm in alarms:
-            fire_at = datetime.fromisoformat(alarm['fire_at'])
-            schedule_alarm(
-                job_queue,
-                alarm_id=alarm['alarm_id'],
-                chat_id=alarm['chat_id'],
-                message=alarm['message'],
-                fire_at=fire_at,
-                repeat=alarm.get('repeat'),
-            )
-            count += 1
+        async for page in get_store().iter_active_alarms():
+            for alarm in page:
+                fire_at = datetime.fromisoformat(alarm['fire_at'])
+                await schedule_alarm(
+                    job_queue,
+                    alarm_id=alarm['alarm_id'],
+                    chat_id=alarm['chat_id'],
+                    message=alarm['message'],
+                    fire_at=fire_at,
+                    repeat=alarm.get('repeat'),
+                )
+                count += 1
         logger.info('Restored %d alarms', count)
     except Exception:
         logger.error('Failed to restore alarms', exc_info=True)
@@ -1,11 +1,11 @@
-"""Daily briefing — scheduling, callback, and restore via Qdrant + telegram JobQueue."""
+"""Daily briefing — scheduling, callback, and restore via the state store + telegram JobQueue."""
 
 import logging
 from datetime import time as dt_time, timezone, timedelta
 
 from telegram.ext import ContextTypes
 
-from memory import qdrant_store as qs
+from memory.state_store import get_store
 
 logger = logging.getLogger(__name__)
 
@@ -18,17 +18,20 @@ async def _briefing_callback(context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = job.data['chat_id']
 
     try:
-        from agent import agent, set_memory_context
+        from agent import ChatDeps, agent
+        from chat_queue import get_chat_queue
+        from usage_stats import get_usage_stats
         from memory.manager import get_relevant_context
         from format import md_to_html, strip_markdown, strip_think
 
         mem_ctx = await get_relevant_context(chat_id, '오늘 일정, 읽지 않은 메일, 할일 요약')
-        set_memory_context(mem_ctx)
 
-        result = await agent.run(
-            '오늘 일정, 읽지 않은 메일, 할일을 요약해줘. 간결하게 브리핑 형식으로.',
-            deps=chat_id,
-        )
+        async with get_chat_queue().slot():
+            result = await agent.run(
+                '오늘 일정, 읽지 않은 메일, 할일을 요약해줘. 간결하게 브리핑 형식으로.',
+                deps=ChatDeps(chat_id, memory_context=mem_ctx),
+            )
+        get_usage_stats().record(chat_id, result.usage())
         text = strip_think(result.output or '')
         if not text:
             text = '오늘 브리핑할 내용이 없습니다.'
@@ -78,17 +81,17 @@ def schedule_briefing(job_queue, chat_id: int, time_str: str) -> None:
 
 async def create_briefing(job_queue, chat_id: int, time_str: str) -> None:
     """Create and persist a new briefing schedule."""
-    qs.save_briefing(chat_id, time_str)
+    await get_store().save_briefing(chat_id, time_str)
     schedule_briefing(job_queue, chat_id, time_str)
 
 
 async def stop_briefing_schedule(job_queue, chat_id: int) -> bool:
     """Stop and deactivate briefing for a chat. Returns True if was active."""
-    briefing = qs.load_briefing(chat_id)
+    briefing = await get_store().load_briefing(chat_id)
     if not briefing or not briefing.get('active'):
         return False
 
-    qs.deactivate_briefing(chat_id)
+    await get_store().deactivate_briefing(chat_id)
 
     job_name = f'briefing-{chat_id}'
     current_jobs = job_queue.get_jobs_by_name(job_name)
@@ -99,14 +102,14 @@ async def stop_briefing_schedule(job_queue, chat_id: int) -> bool:
     return True
 
 
-def restore_briefings(job_queue) -> int:
-    """Restore active briefings from Qdrant and re-register in JobQueue."""
+async def restore_briefings(job_queue) -> int:
+    """Restore active briefings from the state store and re-register in JobQueue."""
     count = 0
     try:
-        briefings = qs.load_active_briefings()
-        for b in briefings:
-            schedule_briefing(job_queue, b['chat_id'], b['time'])
-            count += 1
+        async for page in get_store().iter_active_briefings():
+            for b in page:
+                schedule_briefing(job_queue, b['chat_id'], b['time'])
+                count += 1
         logger.info('Restored %d briefings', count)
     except Exception:
         logger.error('Failed to restore briefings', exc_info=True)
@@ -0,0 +1,84 @@
+"""Compression of large text payload fields (history JSON, conversation text).
+
+Texts of at least PAYLOAD_COMPRESS_MIN_BYTES (UTF-8) are compressed with zstd,
+or zlib when the zstandard package isn't installed.  Two encodings:
+
+- Qdrant payloads (JSON): ``{'codec': 'zstd', 'data': <base64>}`` in place of
+  the string.  Plain strings are left as-is, so old points read unchanged.
+- SQLite: the raw compressed bytes as a BLOB; codec is told by the frame magic.
+
+``unpack`` / ``from_blob`` accept both compressed and plain values.
+"""
+
+import base64
+import logging
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_COMPRESSION = os.getenv('PAYLOAD_COMPRESSION', 'zstd')  # zstd | zlib | off
+PAYLOAD_COMPRESS_MIN_BYTES = int(os.getenv('PAYLOAD_COMPRESS_MIN_BYTES', '1024'))
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+    if PAYLOAD_COMPRESSION == 'zstd':
+        logger.warning('zstandard not installed — compressing payloads with zlib')
+
+CODEC = 'off' if PAYLOAD_COMPRESSION == 'off' else ('zstd' if PAYLOAD_COMPRESSION == 'zstd' and zstandard else 'zlib')
+
+
+def compress(data: bytes, codec: str = CODEC) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(data: bytes, codec: str | None = None) -> bytes:
+    if codec is None:
+        codec = 'zstd' if data[:4] == ZSTD_MAGIC else 'zlib'
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstd-compressed payload but zstandard is not installed')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _worth_it(raw: bytes) -> bool:
+    return CODEC != 'off' and len(raw) >= PAYLOAD_COMPRESS_MIN_BYTES
+
+
+# ── Qdrant payload fields ──
+
+
+def pack(text: str) -> str | dict:
+    """Payload value for a text field — compressed if large enough."""
+    raw = text.encode()
+    if not _worth_it(raw):
+        return text
+    return {'codec': CODEC, 'data': base64.b64encode(compress(raw)).decode('ascii')}
+
+
+def unpack(value: str | dict | None) -> str | None:
+    """Inverse of pack(); plain strings pass through."""
+    if isinstance(value, dict) and 'codec' in value:
+        return decompress(base64.b64decode(value['data']), value['codec']).decode()
+    return value
+
+
+# ── SQLite columns ──
+
+
+def to_blob(text: str) -> str | bytes:
+    raw = text.encode()
+    return compress(raw) if _worth_it(raw) else text
+
+
+def from_blob(value: str | bytes) -> str:
+    return decompress(value).decode() if isinstance(value, bytes) else value
@@ -0,0 +1,152 @@
+"""Out-of-process embedding worker — BGE-M3 runs in a long-lived child process.
+
+Tokenization and the Python side of sentence-transformers hold the GIL, so
+encoding in a thread of the bot process adds latency to Telegram handling.
+The child owns the model; requests go over its stdin as JSON lines and vectors
+come back through a shared memory buffer (no pickled float lists).
+
+Parent side is blocking and meant to be called from the embedding batcher's
+dedicated executor thread.  Run directly with ``python -m memory.embed_worker``.
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class EmbeddingWorker:
+    """Parent-side handle: spawns the child on demand, restarts it if it dies."""
+
+    def __init__(self, dim: int, min_rows: int) -> None:
+        self.dim = dim
+        self.min_rows = min_rows
+        self._proc: subprocess.Popen | None = None
+        self._shm: shared_memory.SharedMemory | None = None
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        logger.info('Starting embedding worker process ...')
+        self._proc = subprocess.Popen(
+            [sys.executable, '-m', 'memory.embed_worker'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=_SRC_DIR,
+            text=True,
+            bufsize=1,
+        )
+        ready = self._proc.stdout.readline()
+        if not ready:
+            raise RuntimeError('embedding worker exited during startup')
+        logger.info('Embedding worker ready (pid %d)', self._proc.pid)
+
+    def _ensure_buffer(self, rows: int) -> shared_memory.SharedMemory:
+        if self._shm is None or rows > self._rows:
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+            self._rows = max(rows, self.min_rows)
+            self._shm = shared_memory.SharedMemory(create=True, size=self._rows * self.dim * 4)
+        return self._shm
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            shm = self._ensure_buffer(len(texts))
+            self._proc.stdin.write(json.dumps({'texts': texts, 'shm': shm.name}) + '\n')
+            self._proc.stdin.flush()
+            line = self._proc.stdout.readline()
+            if not line:
+                raise RuntimeError('embedding worker died')
+            resp = json.loads(line)
+            if 'error' in resp:
+                raise RuntimeError(f'embedding worker error: {resp["error"]}')
+            # Copy out — the buffer is reused by the next batch
+            return np.ndarray((resp['n'], self.dim), dtype=np.float32, buffer=shm.buf).copy()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._proc is not None and self._proc.poll() is None:
+                self._proc.stdin.close()
+                try:
+                    self._proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self._proc.kill()
+            self._proc = None
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+                self._shm = None
+
+
+_worker: EmbeddingWorker | None = None
+
+
+def get_worker(dim: int, min_rows: int) -> EmbeddingWorker:
+    global _worker
+    if _worker is None:
+        _worker = EmbeddingWorker(dim, min_rows)
+    return _worker
+
+
+def close_worker() -> None:
+    if _worker is not None:
+        _worker.close()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    # The parent owns the segment; don't let this process's tracker unlink it
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def main() -> None:
+    # Keep the protocol channel private; anything libraries print goes to stderr
+    proto = os.fdopen(os.dup(sys.stdout.fileno()), 'w', buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    logging.basicConfig(
+        format='%(asctime)s [%(name)s] %(levelname)s: %(message)s',
+        level=logging.INFO,
+    )
+
+    from memory.embeddings import _embed_sync, _load_model
+
+    _load_model()
+    proto.write(json.dumps({'ready': True}) + '\n')
+
+    shm: shared_memory.SharedMemory | None = None
+    for line in sys.stdin:
+        req = json.loads(line)
+        try:
+            if shm is None or shm.name != req['shm']:
+                if shm is not None:
+                    shm.close()
+                shm = _attach(req['shm'])
+            vectors = _embed_sync(req['texts'])
+            out = np.ndarray(vectors.shape, dtype=np.float32, buffer=shm.buf)
+            out[:] = vectors
+            del out
+            resp = {'n': len(vectors)}
+        except Exception as e:
+            logger.error('Embedding worker request failed', exc_info=True)
+            resp = {'error': repr(e)}
+        proto.write(json.dumps(resp) + '\n')
+
+    if shm is not None:
+        shm.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Two-tier embedding cache — in-process LRU + optional mmap-backed disk store.
+
+Keys are a hash of the normalized text (NFC, collapsed whitespace), so the same
+sentence re-sent with different spacing still hits.  The disk tier is a fixed
+capacity ring of float32 rows in an ``np.memmap``; when full, the oldest slot is
+overwritten.  Its key index and write position are rebuilt from the keys and
+sequence files on open, so it survives restarts (and crashes) without a
+separate database.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KEY_SIZE = 16
+
+
+def cache_key(text: str) -> bytes:
+    """Stable digest of the normalized text."""
+    normalized = unicodedata.normalize('NFC', ' '.join(text.split()))
+    return hashlib.blake2b(normalized.encode(), digest_size=KEY_SIZE).digest()
+
+
+class LRUCache:
+    """Bounded in-process LRU of float32 vectors."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[bytes, np.ndarray] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        vec = self._data.get(key)
+        if vec is not None:
+            self._data.move_to_end(key)
+        return vec
+
+    def put(self, key: bytes, vec: np.ndarray) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = vec
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class DiskCache:
+    """Fixed-capacity ring of float32 vectors persisted in memory-mapped files.
+
+    Files: ``<path>.vec`` (capacity x dim float32), ``<path>.keys``
+    (capacity x 16 bytes), ``<path>.seq`` (capacity x uint64 write sequence,
+    0 = empty) and ``<path>.meta.json`` (model, dim, capacity).  The ring's
+    head is the slot after the highest sequence, so it is right even if the
+    process died before a flush.  A metadata mismatch (e.g. a different model)
+    resets the store.
+    """
+
+    def __init__(self, path: str, dim: int, capacity: int, model: str) -> None:
+        self.path = path
+        self.dim = dim
+        self.capacity = capacity
+        self.model = model
+        self._meta_path = f'{path}.meta.json'
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        meta = self._read_meta()
+        fresh = (
+            (meta.get('model'), meta.get('dim'), meta.get('capacity')) != (model, dim, capacity)
+            or not os.path.exists(f'{path}.vec')
+            or not os.path.exists(f'{path}.keys')
+            or not os.path.exists(f'{path}.seq')
+        )
+        mode = 'w+' if fresh else 'r+'
+        if fresh:
+            logger.info('Creating embedding disk cache at %s (%d slots)', path, capacity)
+
+        self._vecs = np.memmap(f'{path}.vec', dtype=np.float32, mode=mode, shape=(capacity, dim))
+        self._keys = np.memmap(f'{path}.keys', dtype=np.uint8, mode=mode, shape=(capacity, KEY_SIZE))
+        self._seqs = np.memmap(f'{path}.seq', dtype=np.uint64, mode=mode, shape=(capacity,))
+
+        # A slot counts once its sequence is written (the last of its three writes)
+        self._index: dict[bytes, int] = {}
+        for slot in np.flatnonzero(self._seqs):
+            self._index[self._keys[slot].tobytes()] = int(slot)
+        last = int(np.argmax(self._seqs))
+        self._seq = int(self._seqs[last])
+        self.head = (last + 1) % capacity if self._seq else 0
+        if fresh:
+            self._write_meta()
+        else:
+            logger.info('Opened embedding disk cache at %s (%d/%d entries)', path, len(self._index), capacity)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self._meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self) -> None:
+        tmp = f'{self._meta_path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'model': self.model, 'dim': self.dim, 'capacity': self.capacity}, f)
+        os.replace(tmp, self._meta_path)
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        slot = self._index.get(key)
+        if slot is None:
+            return None
+        return np.array(self._vecs[slot])
+
+    def put(self, key: bytes, vec: np.ndarray) -> None:
+        if key in self._index:
+            return
+        slot = self.head
+        if self._seqs[slot]:
+            self._index.pop(self._keys[slot].tobytes(), None)
+            self._seqs[slot] = 0
+        # Vector, key, then sequence — a slot with a sequence has both written
+        self._vecs[slot] = vec
+        self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+        self._seq += 1
+        self._seqs[slot] = self._seq
+        self._index[key] = slot
+        self.head = (slot + 1) % self.capacity
+
+    def flush(self) -> None:
+        self._vecs.flush()
+        self._keys.flush()
+        self._seqs.flush()
+
+
+class EmbeddingCache:
+    """LRU in front of an optional disk tier, with hit/miss counters."""
+
+    def __init__(self, memory_size: int, disk: DiskCache | None = None) -> None:
+        self.memory = LRUCache(memory_size)
+        self.disk = disk
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        vec = self.memory.get(key)
+        if vec is not None:
+            self.hits_memory += 1
+            return vec
+        if self.disk is not None:
+            vec = self.disk.get(key)
+            if vec is not None:
+                self.hits_disk += 1
+                self.memory.put(key, vec)
+                return vec
+        self.misses += 1
+        return None
+
+    def put(self, key: bytes, vec: np.ndarray) -> None:
+        self.memory.put(key, vec)
+        if self.disk is not None:
+            self.disk.put(key, vec)
+
+    def flush(self) -> None:
+        if self.disk is not None:
+            self.disk.flush()
+
+    def stats(self) -> dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            'memory_entries': len(self.memory),
+            'disk_entries': len(self.disk) if self.disk is not None else 0,
+            'hits_memory': self.hits_memory,
+            'hits_disk': self.hits_disk,
+            'misses': self.misses,
+            'hit_rate': (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+        }
@@ -3,40 +3,311 @@
 import asyncio
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 
 import numpy as np
 
+from memory.embedding_cache import DiskCache, EmbeddingCache, cache_key
+from metrics import timed
+
 logger = logging.getLogger(__name__)
 
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'BAAI/bge-m3')
 EMBEDDING_DIM = 1024
 
+# Encoder backend: 'torch' (fp32 sentence-transformers) or 'onnx-int8'
+# (dynamically quantized model on ONNX Runtime, exported on first use)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_ONNX_DIR = os.getenv(
+    'EMBEDDING_ONNX_DIR', os.path.expanduser('~/.cache/huggingface/jarvis-onnx/bge-m3'),
+)
+# Quantization target: arm64, avx2, avx512, avx512_vnni
+EMBEDDING_ONNX_QCONFIG = os.getenv('EMBEDDING_ONNX_QCONFIG', 'avx512_vnni')
 
-@lru_cache(maxsize=1)
-def _load_model():
-    """Load sentence-transformers model (called once, ~15s on CPU)."""
+# In-process LRU entries (~4KB each)
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '4096'))
+# Persistent cache path prefix — set it empty to disable the disk tier
+EMBEDDING_DISK_CACHE = os.getenv(
+    'EMBEDDING_DISK_CACHE', os.path.expanduser('~/.cache/huggingface/jarvis-embeddings/bge-m3'),
+)
+EMBEDDING_DISK_CACHE_SIZE = int(os.getenv('EMBEDDING_DISK_CACHE_SIZE', '100000'))
+
+# Micro-batching: concurrent requests are merged into one encode call
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', '32'))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_MAX_WAIT_MS', '5'))
+
+
+# Where the encoder runs: 'thread' (in-process executor) or 'process' (child worker)
+EMBEDDING_WORKER = os.getenv('EMBEDDING_WORKER', 'thread')
+
+_cache: EmbeddingCache | None = None
+
+
+def _get_cache() -> EmbeddingCache:
+    """Open the cache on first use (keeps importing this module side-effect free)."""
+    global _cache
+    if _cache is None:
+        disk = None
+        if EMBEDDING_DISK_CACHE:
+            try:
+                disk = DiskCache(
+                    EMBEDDING_DISK_CACHE, EMBEDDING_DIM, EMBEDDING_DISK_CACHE_SIZE,
+                    f'{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}',
+                )
+            except Exception:
+                logger.error('Embedding disk cache unavailable — memory tier only', exc_info=True)
+        _cache = EmbeddingCache(EMBEDDING_CACHE_SIZE, disk)
+    return _cache
+
+
+def _load_onnx_int8():
+    """Load the int8 ONNX model, exporting + quantizing it once if missing."""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    file_name = f'onnx/model_qint8_{EMBEDDING_ONNX_QCONFIG}.onnx'
+    if not os.path.exists(os.path.join(EMBEDDING_ONNX_DIR, file_name)):
+        logger.info('Exporting %s to ONNX + int8 (%s) ...', EMBEDDING_MODEL, EMBEDDING_ONNX_QCONFIG)
+        fp32 = SentenceTransformer(EMBEDDING_MODEL, device='cpu', backend='onnx')
+        fp32.save(EMBEDDING_ONNX_DIR)
+        export_dynamic_quantized_onnx_model(fp32, EMBEDDING_ONNX_QCONFIG, EMBEDDING_ONNX_DIR)
+        del fp32
+    return SentenceTransformer(
+        EMBEDDING_ONNX_DIR, device='cpu', backend='onnx', model_kwargs={'file_name': file_name},
+    )
+
+
+@lru_cache(maxsize=2)
+def _load_model(backend: str = EMBEDDING_BACKEND):
+    """Load sentence-transformers model (called once, ~15s on CPU for fp32)."""
     from sentence_transformers import SentenceTransformer
 
-    logger.info('Loading embedding model %s ...', EMBEDDING_MODEL)
-    model = SentenceTransformer(EMBEDDING_MODEL, device='cpu')
+    logger.info('Loading embedding model %s (%s) ...', EMBEDDING_MODEL, backend)
+    if backend == 'onnx-int8':
+        model = _load_onnx_int8()
+    else:
+        model = SentenceTransformer(EMBEDDING_MODEL, device='cpu')
     logger.info('Embedding model loaded.')
     return model
 
 
-def _embed_sync(texts: list[str]) -> list[list[float]]:
-    model = _load_model()
+def _embed_sync(texts: list[str], backend: str = EMBEDDING_BACKEND) -> np.ndarray:
+    model = _load_model(backend)
     embeddings = model.encode(texts, normalize_embeddings=True)
-    return [e.tolist() for e in embeddings]
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    """Batch encode function for the configured EMBEDDING_WORKER."""
+    if EMBEDDING_WORKER == 'process':
+        from memory.embed_worker import get_worker
+
+        logger.info('Embedding encoder runs in a child process')
+        return get_worker(EMBEDDING_DIM, EMBEDDING_BATCH_MAX_SIZE).encode
+    return _embed_sync
+
+
+class _BatchScheduler:
+    """Collects embed requests for up to max_wait, then runs one batched encode.
+
+    Encoding happens on a dedicated single-thread executor, so batches run one
+    at a time instead of N single-item forward passes fighting for CPU cores.
+    """
+
+    def __init__(self, max_size: int, max_wait_ms: float) -> None:
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        # A request that didn't fit in the last batch opens the next one
+        self._carry: tuple[list[str], asyncio.Future, float] | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embed')
+        # Metrics
+        self.batches = 0
+        self.requests = 0
+        self.items = 0
+        self.max_batch = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.encode_total = 0.0
+
+    async def submit(self, texts: list[str]) -> np.ndarray:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            # Same queue: requests already waiting are picked up by the new task
+            self._task = asyncio.create_task(self._run())
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        await self._queue.put((texts, fut, loop.time()))
+        return await fut
+
+    async def _collect(self) -> list[tuple[list[str], asyncio.Future, float]]:
+        loop = asyncio.get_running_loop()
+        if self._carry is not None:
+            batch, self._carry = [self._carry], None
+        else:
+            batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while size < self.max_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if size + len(item[0]) > self.max_size:
+                self._carry = item
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
 
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [b for b in await self._collect() if not b[1].done()]
+            if not batch:
+                continue
+            texts = [t for b in batch for t in b[0]]
+            started = loop.time()
+            for _, _, enqueued in batch:
+                wait = started - enqueued
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            try:
+                vectors = await loop.run_in_executor(self._executor, _get_encoder(), texts)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.encode_total += loop.time() - started
+            self.batches += 1
+            self.requests += len(batch)
+            self.items += len(texts)
+            self.max_batch = max(self.max_batch, len(texts))
 
-async def embed_texts(texts: list[str]) -> list[list[float]]:
-    """Embed multiple texts asynchronously (runs in executor to avoid blocking)."""
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _embed_sync, texts)
+            offset = 0
+            for req_texts, fut, _ in batch:
+                if not fut.done():
+                    fut.set_result(vectors[offset:offset + len(req_texts)])
+                offset += len(req_texts)
 
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'items': self.items,
+            'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch,
+            'avg_queue_wait_ms': self.wait_total / self.requests * 1000 if self.requests else 0.0,
+            'max_queue_wait_ms': self.wait_max * 1000,
+            'avg_encode_ms': self.encode_total / self.batches * 1000 if self.batches else 0.0,
+        }
 
-async def embed_text(text: str) -> list[float]:
-    """Embed a single text."""
+
+_scheduler = _BatchScheduler(EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_WAIT_MS)
+
+# Set once the model is loaded and has run its first encode
+_ready = asyncio.Event()
+WARM_UP_RETRY_S = 5
+WARM_UP_RETRY_MAX_S = 300
+
+
+async def warm_up() -> None:
+    """Load the model and run a dummy encode (started in the background at boot).
+
+    Retries with exponential backoff until it succeeds, or until any other
+    encode succeeds first.
+    """
+    start = time.perf_counter()
+    delay = WARM_UP_RETRY_S
+    while not _ready.is_set():
+        try:
+            await _scheduler.submit(['warm-up'])
+        except Exception:
+            logger.error('Embedding warm-up failed — retrying in %.0fs', delay, exc_info=True)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARM_UP_RETRY_MAX_S)
+            continue
+        _ready.set()
+        logger.info(
+            'Embedding model warm in %.1fs (%s, %s)', time.perf_counter() - start, EMBEDDING_BACKEND, EMBEDDING_WORKER,
+        )
+
+
+async def wait_ready(timeout: float) -> bool:
+    """Wait up to timeout seconds for warm-up. Returns readiness."""
+    if _ready.is_set():
+        return True
+    try:
+        await asyncio.wait_for(_ready.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+@timed('stage', 'embed_texts')
+async def embed_texts(texts: list[str]) -> np.ndarray:
+    """Embed texts → (n, EMBEDDING_DIM) float32 array (cache first, misses go through the batcher)."""
+    cache = _get_cache()
+    keys = [cache_key(t) for t in texts]
+    vectors = [cache.get(k) for k in keys]
+
+    # Encode each distinct missing text once
+    pending: dict[bytes, str] = {}
+    for key, text, vec in zip(keys, texts, vectors):
+        if vec is None:
+            pending.setdefault(key, text)
+    if pending:
+        encoded = await _scheduler.submit(list(pending.values()))
+        _ready.set()  # the model works, even if warm-up hasn't got there yet
+        fresh = dict(zip(pending, encoded))
+        for key, vec in fresh.items():
+            cache.put(key, vec)
+        vectors = [fresh[k] if v is None else v for k, v in zip(keys, vectors)]
+
+    if not vectors:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    return np.stack(vectors)
+
+
+async def embed_text(text: str) -> np.ndarray:
+    """Embed a single text → (EMBEDDING_DIM,) float32 array."""
     results = await embed_texts([text])
     return results[0]
+
+
+def cache_stats() -> dict:
+    """Embedding cache hit/miss counters and sizes."""
+    return _get_cache().stats()
+
+
+def batch_stats() -> dict:
+    """Micro-batching metrics (batch size, queue wait, encode time)."""
+    return _scheduler.stats()
+
+
+def flush_cache() -> None:
+    """Persist the disk tier (called on shutdown)."""
+    try:
+        _get_cache().flush()
+    except Exception:
+        logger.error('Failed to flush embedding cache', exc_info=True)
+
+
+def shutdown() -> None:
+    """Flush the cache and stop the child encoder process, if any."""
+    flush_cache()
+    if EMBEDDING_WORKER == 'process':
+        from memory.embed_worker import close_worker
+
+        close_worker()
@@ -5,15 +5,19 @@ import logging
 import os
 
 import httpx
+import numpy as np
 
 from memory import qdrant_store as qs
-from memory.embeddings import embed_text
+from memory.embeddings import embed_texts
 
 logger = logging.getLogger(__name__)
 
 VLLM_BASE_URL = os.getenv('VLLM_BASE_URL', 'http://vllm:8000/v1')
 VLLM_MODEL = os.getenv('VLLM_MODEL', 'Qwen/Qwen3-32B')
 
+# Cosine similarity above which an insight counts as already known
+DUPLICATE_THRESHOLD = 0.85
+
 EXTRACTION_PROMPT = """\
 다음 대화에서 사용자(제리)에 대한 새로운 인사이트를 추출해라.
 카테고리: preference(선호), habit(습관), fact(사실), relationship(관계)
@@ -60,25 +64,43 @@ async def maybe_extract_insights(
         if not isinstance(insights, list):
             return
 
+        candidates = []
         for insight in insights:
             if not isinstance(insight, dict) or 'content' not in insight:
                 continue
-            text = insight['content']
-            category = insight.get('category', 'fact')
             confidence = float(insight.get('confidence', 0.5))
-
             if confidence < 0.3:
                 continue
+            candidates.append({
+                'content': insight['content'],
+                'category': insight.get('category', 'fact'),
+                'confidence': confidence,
+            })
+        if not candidates:
+            return
 
-            vector = await embed_text(text)
-            # Check for duplicates — if very similar memory exists, skip
-            existing = qs.search_memories(vector, limit=1)
-            if existing and existing[0].get('score', 0) > 0.85:
-                logger.debug('Skipping duplicate insight: %s', text)
+        # One encode, one batched dedup query, one upsert
+        vectors = await embed_texts([c['content'] for c in candidates])
+        existing = await qs.search_memories_batch(vectors, limit=1)
+
+        keep: list[int] = []
+        for i, (candidate, hits) in enumerate(zip(candidates, existing)):
+            # Duplicate of a stored memory
+            if hits and hits[0].get('score', 0) > DUPLICATE_THRESHOLD:
+                logger.debug('Skipping duplicate insight: %s', candidate['content'])
+                continue
+            # Duplicate of another insight from this batch (vectors are normalized → dot = cosine)
+            if keep and float(np.max(vectors[keep] @ vectors[i])) > DUPLICATE_THRESHOLD:
+                logger.debug('Skipping repeated insight: %s', candidate['content'])
                 continue
+            keep.append(i)
 
-            qs.upsert_memory(vector, text, category, confidence)
-            logger.info('Extracted insight: [%s] %s (%.2f)', category, text, confidence)
+        if not keep:
+            return
+        survivors = [candidates[i] for i in keep]
+        await qs.upsert_memories(vectors[keep], survivors)
+        for c in survivors:
+            logger.info('Extracted insight: [%s] %s (%.2f)', c['category'], c['content'], c['confidence'])
 
     except Exception:
         logger.error('Insight extraction failed', exc_info=True)
@@ -0,0 +1,193 @@
+"""Bounded in-memory cache of chat histories.
+
+Replaces the unbounded ``chat_histories`` dict in bot.py.  Holds at most
+HISTORY_CACHE_MAX_CHATS histories and roughly HISTORY_CACHE_MAX_MB of message
+data; the least recently used chat is evicted first.  Chats that are pinned
+(a message is being handled) or still have a memory write in flight are
+never evicted.
+
+Once the memory system is up, attach() wires in the state store: evicted
+histories are spilled to it (a no-op when the writer already persisted
+them) and a miss reloads the chat from it, so eviction is invisible to the
+conversation.  Without a store attached, eviction simply forgets the chat.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterator, MutableMapping
+from contextlib import contextmanager
+
+from pydantic_ai.messages import ModelMessage
+
+from history import message_text
+
+logger = logging.getLogger(__name__)
+
+HISTORY_CACHE_MAX_CHATS = int(os.getenv('HISTORY_CACHE_MAX_CHATS', '256'))
+HISTORY_CACHE_MAX_MB = float(os.getenv('HISTORY_CACHE_MAX_MB', '256'))
+
+# Rough per-object cost of the message/part dataclasses around the text
+MESSAGE_OVERHEAD_BYTES = 400
+PART_OVERHEAD_BYTES = 300
+
+Loader = Callable[[int], Awaitable[list[ModelMessage]]]
+Spiller = Callable[[int, list[ModelMessage]], Awaitable[None]]
+
+
+def estimate_bytes(messages: list[ModelMessage]) -> int:
+    """Approximate resident size of a history's object graph."""
+    return sum(
+        MESSAGE_OVERHEAD_BYTES + PART_OVERHEAD_BYTES * len(m.parts) + sys.getsizeof(message_text(m))
+        for m in messages
+    )
+
+
+class HistoryCache(MutableMapping[int, list[ModelMessage]]):
+    def __init__(self, max_chats: int, max_bytes: int) -> None:
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[int, list[ModelMessage]] = OrderedDict()
+        self._sizes: dict[int, int] = {}
+        self._bytes = 0
+        self._pins: dict[int, int] = {}
+        # Evicted histories whose spill hasn't finished — still served on a miss
+        self._spilling: dict[int, list[ModelMessage]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._load: Loader | None = None
+        self._spill: Spiller | None = None
+        self._busy: Callable[[int], bool] = lambda chat_id: False
+        # Metrics
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.spill_failures = 0
+
+    def attach(self, load: Loader, spill: Spiller, busy: Callable[[int], bool]) -> None:
+        """Back the cache with the persistent store (reload on miss, spill on evict)."""
+        self._load = load
+        self._spill = spill
+        self._busy = busy
+
+    # ── mapping ──
+
+    def __getitem__(self, chat_id: int) -> list[ModelMessage]:
+        messages = self._data[chat_id]
+        self._data.move_to_end(chat_id)
+        return messages
+
+    def __setitem__(self, chat_id: int, messages: list[ModelMessage]) -> None:
+        size = estimate_bytes(messages)
+        self._bytes += size - self._sizes.get(chat_id, 0)
+        self._sizes[chat_id] = size
+        self._data[chat_id] = messages
+        self._data.move_to_end(chat_id)
+        self._evict()
+
+    def __delitem__(self, chat_id: int) -> None:
+        del self._data[chat_id]
+        self._bytes -= self._sizes.pop(chat_id)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, chat_id: object) -> bool:
+        return chat_id in self._data
+
+    # ── loading / pinning ──
+
+    async def load(self, chat_id: int) -> list[ModelMessage]:
+        """History for a chat, reloaded from the store if it isn't resident."""
+        if chat_id in self._data:
+            self.hits += 1
+            return self[chat_id]
+        messages = self._spilling.get(chat_id)
+        if messages is None:
+            messages = await self._load(chat_id) if self._load is not None else []
+            self.loads += 1
+        if chat_id not in self._data:  # a concurrent load may have won
+            self[chat_id] = messages
+        return self[chat_id]
+
+    def preload(self, chat_id: int, messages: list[ModelMessage]) -> bool:
+        """Insert without evicting anything (startup restore). False if there is no room."""
+        size = estimate_bytes(messages)
+        if len(self._data) >= self.max_chats or self._bytes + size > self.max_bytes:
+            return False
+        self[chat_id] = messages
+        return True
+
+    @contextmanager
+    def pin(self, chat_id: int):
+        """Keep a chat resident while a message for it is being handled."""
+        self._pins[chat_id] = self._pins.get(chat_id, 0) + 1
+        try:
+            yield
+        finally:
+            self._pins[chat_id] -= 1
+            if not self._pins[chat_id]:
+                del self._pins[chat_id]
+            self._evict()
+
+    # ── eviction ──
+
+    def _over(self) -> bool:
+        return len(self._data) > self.max_chats or self._bytes > self.max_bytes
+
+    def _evict(self) -> None:
+        if not self._over():
+            return
+        for chat_id in list(self._data):
+            if not self._over():
+                break
+            if chat_id in self._pins or self._busy(chat_id):
+                continue
+            messages = self._data[chat_id]
+            del self[chat_id]
+            self.evictions += 1
+            # Empty histories too: after a /reset the store still has the old one
+            if self._spill is not None:
+                self._spilling[chat_id] = messages
+                task = asyncio.create_task(self._spill_one(chat_id, messages))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _spill_one(self, chat_id: int, messages: list[ModelMessage]) -> None:
+        try:
+            await self._spill(chat_id, messages)
+        except Exception:
+            self.spill_failures += 1
+            # Keep it resident rather than lose it
+            if chat_id not in self._data:
+                self._data[chat_id] = messages
+                self._sizes[chat_id] = estimate_bytes(messages)
+                self._bytes += self._sizes[chat_id]
+                self._data.move_to_end(chat_id, last=False)
+            logger.error('Failed to spill history for chat %d', chat_id, exc_info=True)
+        finally:
+            if self._spilling.get(chat_id) is messages:
+                del self._spilling[chat_id]
+
+    async def flush(self) -> None:
+        """Wait for in-flight spills (shutdown)."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            'chats': len(self._data),
+            'resident_mb': round(self._bytes / 1e6, 2),
+            'max_chats': self.max_chats,
+            'max_mb': round(self.max_bytes / 1e6, 2),
+            'pinned': len(self._pins),
+            'spilling': len(self._spilling),
+            'hits': self.hits,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'spill_failures': self.spill_failures,
+        }
@@ -0,0 +1,79 @@
+"""Scheduled maintenance of the conversations collection.
+
+Every turn adds a point to ``conversations``; without upkeep the collection and
+its HNSW graph grow forever.  A repeating JobQueue job applies the retention
+policy, which deletes turns and is therefore opt-in:
+
+- turns older than CONVERSATION_RETENTION_DAYS are deleted (0 = keep all);
+- chats above CONVERSATION_MAX_PER_CHAT turns lose their oldest ones (0 = no cap).
+
+Old turns are deleted, not merged into summaries: insights worth keeping
+long-term already live in ``memories``.  Search ranks the remaining turns with
+a recency decay (see qdrant_store.search_conversations).
+"""
+
+import logging
+import os
+import time
+
+from telegram.ext import ContextTypes
+
+from memory import qdrant_store as qs
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_RETENTION_DAYS = float(os.getenv('CONVERSATION_RETENTION_DAYS', '0'))
+CONVERSATION_MAX_PER_CHAT = int(os.getenv('CONVERSATION_MAX_PER_CHAT', '0'))
+CONVERSATION_MAINTENANCE_HOURS = float(os.getenv('CONVERSATION_MAINTENANCE_HOURS', '24'))
+
+
+async def maintain_conversations() -> dict:
+    """Apply the retention policy once. Returns what was done."""
+    start = time.perf_counter()
+    before = await qs.conversation_counts()
+
+    if CONVERSATION_RETENTION_DAYS > 0:
+        await qs.expire_conversations(CONVERSATION_RETENTION_DAYS)
+
+    trimmed = 0
+    if CONVERSATION_MAX_PER_CHAT > 0:
+        counts = await qs.conversation_counts()
+        for chat_id, count in counts.items():
+            if count > CONVERSATION_MAX_PER_CHAT:
+                trimmed += await qs.trim_conversations(chat_id, count - CONVERSATION_MAX_PER_CHAT)
+
+    after = await qs.conversation_counts()
+    total_before, total_after = sum(before.values()), sum(after.values())
+    return {
+        'chats': len(after),
+        'points_before': total_before,
+        'points_after': total_after,
+        'expired': total_before - total_after - trimmed,
+        'trimmed': trimmed,
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+
+
+async def _maintenance_callback(context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        result = await maintain_conversations()
+        logger.info('Conversation maintenance: %s', result)
+    except Exception:
+        logger.error('Conversation maintenance failed', exc_info=True)
+
+
+def schedule_maintenance(job_queue) -> None:
+    """Register the repeating maintenance job (first run shortly after startup), if a policy is set."""
+    if CONVERSATION_RETENTION_DAYS <= 0 and CONVERSATION_MAX_PER_CHAT <= 0:
+        logger.info('Conversation retention off — all turns are kept')
+        return
+    job_queue.run_repeating(
+        _maintenance_callback,
+        interval=CONVERSATION_MAINTENANCE_HOURS * 3600,
+        first=300,
+        name='conversation_maintenance',
+    )
+    logger.info(
+        'Conversation maintenance every %.0fh (retention %.0f days, cap %d per chat)',
+        CONVERSATION_MAINTENANCE_HOURS, CONVERSATION_RETENTION_DAYS, CONVERSATION_MAX_PER_CHAT,
+    )
@@ -1,59 +1,195 @@
 """Memory manager — orchestrates saving, searching, and context injection."""
 
+import asyncio
 import json
 import logging
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
 
-from pydantic_ai.messages import ModelMessage
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter, ModelRequest, SystemPromptPart
 
+from agent import VOLATILE_REF
 from memory import qdrant_store as qs
-from memory.embeddings import embed_text
+from memory.embeddings import embed_text, embed_texts
 from memory.extractor import maybe_extract_insights
+from memory.state_store import get_store
+from metrics import timed
 
 logger = logging.getLogger(__name__)
 
+# Latency budget for the whole retrieval stage (embedding + searches). Searches
+# that haven't answered by then are cancelled and the agent runs without them.
+MEMORY_RETRIEVAL_BUDGET_MS = float(os.getenv('MEMORY_RETRIEVAL_BUDGET_MS', '1500'))
+
+# History persistence: 'incremental' appends each turn's new messages to a
+# per-chat log and folds the log into the snapshot every HISTORY_COMPACT_EVERY
+# appends; 'snapshot' rewrites the whole history every turn.
+HISTORY_PERSIST_MODE = os.getenv('HISTORY_PERSIST_MODE', 'incremental')
+HISTORY_COMPACT_EVERY = int(os.getenv('HISTORY_COMPACT_EVERY', '20'))
+
+# 'eager' restores every chat history at startup; 'lazy' loads a chat's
+# history from the state store on its first message.
+HISTORY_RESTORE = os.getenv('HISTORY_RESTORE', 'eager')
+
 # Turn counter per chat for insight extraction
 _turn_counts: dict[int, int] = {}
 
 
+@dataclass
+class _LogState:
+    seq: int = 0  # last history_log seq written
+    base_seq: int = 0  # seq already folded into the snapshot
+    # The history as last persisted (same message objects); None forces a compaction
+    persisted: list[ModelMessage] | None = None
+
+
+_log_states: dict[int, _LogState] = {}
+
+
+def _dump(messages: list[ModelMessage]) -> str:
+    return ModelMessagesTypeAdapter.dump_json(messages).decode()
+
+
+def _kept_parts(message: ModelMessage) -> list:
+    if not isinstance(message, ModelRequest):
+        return message.parts
+    return [p for p in message.parts if not (isinstance(p, SystemPromptPart) and p.dynamic_ref == VOLATILE_REF)]
+
+
+def _same_message(current: ModelMessage, persisted: ModelMessage) -> bool:
+    """Same message, or a copy that only dropped the per-turn context part.
+
+    volatile_context strips that part from the previous turn's request every
+    turn; the processor drops it again on restore, so the persisted copy is
+    still equivalent.
+    """
+    if current is persisted:
+        return True
+    if type(current) is not type(persisted):
+        return False
+    kept, old = _kept_parts(current), _kept_parts(persisted)
+    return len(kept) == len(old) and all(a is b for a, b in zip(kept, old))
+
+
+def _append_start(messages: list[ModelMessage], persisted: list[ModelMessage] | None) -> int | None:
+    """Index right after the persisted messages, or None if the persisted prefix
+    no longer matches (history reset, trimmed by token_budget, or rewritten)."""
+    if persisted is None or len(messages) < len(persisted):
+        return None
+    if not all(_same_message(a, b) for a, b in zip(messages, persisted)):
+        return None
+    return len(persisted)
+
+
+async def _compact_history(chat_id: int, messages: list[ModelMessage], state: _LogState) -> None:
+    """Write the full history as the snapshot and drop the log entries it covers."""
+    fresh = state.seq == 0
+    state.seq += 1
+    # A fresh state may still have stale log entries from a previous process
+    await get_store().compact_history(
+        chat_id, _dump(messages), state.seq, None if fresh else state.seq,
+    )
+    state.base_seq = state.seq
+    state.persisted = list(messages)
+
+
+async def save_history(chat_id: int, messages: list[ModelMessage]) -> None:
+    """Persist a chat's history — append-only tail, compacted periodically."""
+    state = _log_states.setdefault(chat_id, _LogState())
+    start = _append_start(messages, state.persisted)
+    if (
+        HISTORY_PERSIST_MODE != 'incremental'
+        or start is None
+        or state.seq - state.base_seq >= HISTORY_COMPACT_EVERY
+    ):
+        await _compact_history(chat_id, messages, state)
+        return
+
+    new = messages[start:]
+    if not new:
+        return
+    state.seq += 1
+    await get_store().append_history_log(chat_id, state.seq, _dump(new))
+    state.persisted = list(messages)
+
+
+def mark_history_rewritten(chat_id: int) -> None:
+    """Force the next save to compact (the in-memory history was rewritten)."""
+    state = _log_states.get(chat_id)
+    if state is not None:
+        state.persisted = None
+
+
 async def on_turn_complete(
     chat_id: int,
-    user_text: str,
-    assistant_text: str,
+    turns: list[tuple[str, str]],
     all_messages: list[ModelMessage],
 ) -> None:
-    """Called after each agent turn — saves conversation + snapshot, maybe extracts insights."""
-    try:
-        # 1. Embed and store conversation turn
-        combined = f'User: {user_text}\nAssistant: {assistant_text}'
-        vector = await embed_text(combined)
-        qs.upsert_conversation(vector, chat_id, user_text, assistant_text)
+    """Run by the memory writer for one or more (coalesced) turns of a chat.
 
-        # 2. Save history snapshot
-        from pydantic_ai.messages import ModelMessagesTypeAdapter
-        messages_json = ModelMessagesTypeAdapter.dump_json(all_messages).decode()
-        qs.save_history_snapshot(chat_id, messages_json)
+    Saves the conversation turns + history snapshot, maybe extracts insights.
+    Errors propagate to the writer, which logs and counts them.
+    """
+    # 1. Embed and store conversation turns (one batch)
+    combined = [f'User: {u}\nAssistant: {a}' for u, a in turns]
+    vectors = await embed_texts(combined)
+    await qs.upsert_conversations(vectors, chat_id, turns)
 
-        # 3. Maybe extract insights (every 3 turns)
+    # 2. Persist history (log append or compacted snapshot)
+    await save_history(chat_id, all_messages)
+
+    # 3. Maybe extract insights (every 3 turns)
+    for user_text, assistant_text in turns:
         _turn_counts[chat_id] = _turn_counts.get(chat_id, 0) + 1
         if _turn_counts[chat_id] % 3 == 0:
             await maybe_extract_insights(chat_id, user_text, assistant_text)
 
-        logger.info('Memory saved for chat %d (turn %d)', chat_id, _turn_counts[chat_id])
-    except Exception:
-        logger.error('Failed to save memory for chat %d', chat_id, exc_info=True)
+    logger.info(
+        'Memory saved for chat %d (%d turn(s), turn %d)', chat_id, len(turns), _turn_counts[chat_id],
+    )
 
 
+@timed('stage', 'get_relevant_context')
 async def get_relevant_context(chat_id: int, user_text: str) -> str:
-    """Search conversations + memories + memos and build context string for system prompt."""
+    """Search conversations + memories + memos and build context string for system prompt.
+
+    The three searches run concurrently; whatever has arrived when the
+    retrieval budget runs out is used.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MEMORY_RETRIEVAL_BUDGET_MS / 1000
     try:
-        vector = await embed_text(user_text)
+        try:
+            vector = await asyncio.wait_for(embed_text(user_text), deadline - loop.time())
+        except asyncio.TimeoutError:
+            logger.warning('Retrieval budget spent on embedding for chat %d — no context', chat_id)
+            return ''
+
+        searches = {
+            # Past conversations
+            'convos': asyncio.create_task(qs.search_conversations(vector, chat_id, limit=3)),
+            # Auto-extracted memories
+            'memories': asyncio.create_task(qs.search_memories(vector, limit=5)),
+            # User memos
+            'user_memos': asyncio.create_task(qs.search_memos(vector, chat_id, limit=3)),
+        }
+        done, pending = await asyncio.wait(searches.values(), timeout=max(0.0, deadline - loop.time()))
+        for task in pending:
+            task.cancel()
 
-        # Search past conversations
-        convos = qs.search_conversations(vector, chat_id, limit=3)
-        # Search auto-extracted memories
-        memories = qs.search_memories(vector, limit=5)
-        # Search user memos
-        user_memos = qs.search_memos(vector, chat_id, limit=3)
+        results: dict[str, list[dict]] = {}
+        for name, task in searches.items():
+            if task not in done:
+                logger.warning('Retrieval budget exceeded — %s skipped for chat %d', name, chat_id)
+            elif task.exception() is not None:
+                logger.error('%s search failed for chat %d', name, chat_id, exc_info=task.exception())
+            else:
+                results[name] = task.result()
+        convos = results.get('convos', [])
+        memories = results.get('memories', [])
+        user_memos = results.get('user_memos', [])
 
         parts = []
 
@@ -88,18 +224,68 @@ async def get_relevant_context(chat_id: int, user_text: str) -> str:
         return ''
 
 
-def restore_histories() -> dict[int, list[ModelMessage]]:
-    """Restore all chat histories from Qdrant snapshots."""
-    from pydantic_ai.messages import ModelMessagesTypeAdapter
+def _parse(messages_json: str) -> list[ModelMessage]:
+    return list(ModelMessagesTypeAdapter.validate_json(messages_json))
+
+
+async def _rebuild_history(snap: dict, logs: list[dict]) -> list[ModelMessage]:
+    """Parse a snapshot + its log tail off the event loop and reset the log state."""
+    chat_id = snap['chat_id']
+    tail = sorted((e for e in logs if e['seq'] > snap['seq']), key=lambda e: e['seq'])
+    loop = asyncio.get_running_loop()
+    parts = await asyncio.gather(
+        *(loop.run_in_executor(None, _parse, doc) for doc in [snap['messages_json'], *(e['messages_json'] for e in tail)])
+    )
+    messages = [m for part in parts for m in part]
+    _log_states[chat_id] = _LogState(
+        seq=tail[-1]['seq'] if tail else snap['seq'],
+        base_seq=snap['seq'],
+        persisted=list(messages),
+    )
+    return messages
 
+
+async def restore_histories(limit: int | None = None) -> dict[int, list[ModelMessage]]:
+    """Restore chat histories: latest compacted snapshot + its log tail.
+
+    Streams the snapshots page by page; each page's documents are parsed
+    concurrently in the default executor.  Stops after roughly ``limit``
+    chats — the rest are loaded on their next message.
+    """
     restored: dict[int, list[ModelMessage]] = {}
+    store = get_store()
+    start = time.perf_counter()
+    n_bytes = n_messages = 0
     try:
-        snapshots = qs.load_all_history_snapshots()
-        for snap in snapshots:
-            chat_id = snap['chat_id']
-            messages = ModelMessagesTypeAdapter.validate_json(snap['messages_json'])
-            restored[chat_id] = list(messages)
-            logger.info('Restored history for chat %d (%d messages)', chat_id, len(messages))
+        async for page in store.iter_history_snapshots():
+            logs: dict[int, list[dict]] = defaultdict(list)
+            for entry in await store.load_history_logs([snap['chat_id'] for snap in page]):
+                logs[entry['chat_id']].append(entry)
+            histories = await asyncio.gather(
+                *(_rebuild_history(snap, logs.get(snap['chat_id'], [])) for snap in page)
+            )
+            for snap, messages in zip(page, histories):
+                restored[snap['chat_id']] = messages
+                n_messages += len(messages)
+                n_bytes += len(snap['messages_json']) + sum(len(e['messages_json']) for e in logs.get(snap['chat_id'], []))
+            if limit is not None and len(restored) >= limit:
+                break
     except Exception:
         logger.error('Failed to restore histories', exc_info=True)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        'Restored %d chat histories (%d messages, %.1f MB) in %.2fs — %.0f chats/s, %.1f MB/s',
+        len(restored), n_messages, n_bytes / 1e6, elapsed,
+        len(restored) / elapsed if elapsed else 0, n_bytes / 1e6 / elapsed if elapsed else 0,
+    )
     return restored
+
+
+async def load_history(chat_id: int) -> list[ModelMessage]:
+    """Load one chat's history from the state store (lazy restore). Empty if none."""
+    snap, logs = await get_store().load_history(chat_id)
+    if snap is None:
+        return []
+    messages = await _rebuild_history(snap, logs)
+    logger.info('Loaded history for chat %d (%d messages, %d log entries)', chat_id, len(messages), len(logs))
+    return messages
@@ -1,50 +1,151 @@
-"""Qdrant client singleton and collection CRUD."""
+"""Async Qdrant client singleton and collection CRUD."""
 
+import asyncio
 import logging
 import os
+import time
 import uuid
-from datetime import datetime, timezone
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta, timezone
 
-from qdrant_client import QdrantClient
+import httpx
+import numpy as np
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.http.models import (
+    Batch,
+    DatetimeExpression,
+    DatetimeKeyExpression,
+    DatetimeRange,
+    DecayParamsExpression,
+    Direction,
     Distance,
+    ExpDecayExpression,
     FieldCondition,
     Filter,
+    FilterSelector,
+    FormulaQuery,
+    MatchAny,
     MatchValue,
+    MultExpression,
+    OrderBy,
+    PayloadSchemaType,
+    PointIdsList,
     PointStruct,
+    Prefetch,
+    QueryRequest,
+    Range,
+    SumExpression,
     VectorParams,
 )
 
+from memory.compression import pack, unpack
 from memory.embeddings import EMBEDDING_DIM
+from metrics import timed
 
 logger = logging.getLogger(__name__)
 
 QDRANT_URL = os.getenv('QDRANT_URL', 'http://qdrant:6333')
-
-_client: QdrantClient | None = None
+QDRANT_POOL_SIZE = int(os.getenv('QDRANT_POOL_SIZE', '16'))
+# Write-behind: buffered upserts go out every FLUSH_MS, or as soon as BATCH_SIZE points are pending
+QDRANT_WRITE_FLUSH_MS = float(os.getenv('QDRANT_WRITE_FLUSH_MS', '50'))
+QDRANT_WRITE_BATCH_SIZE = int(os.getenv('QDRANT_WRITE_BATCH_SIZE', '64'))
+# Ceiling on buffered points; past it a write flushes first and fails if Qdrant is down
+QDRANT_WRITE_MAX_PENDING = int(os.getenv('QDRANT_WRITE_MAX_PENDING', '10000'))
+# Background retries back off exponentially up to this many seconds
+QDRANT_WRITE_RETRY_MAX_S = float(os.getenv('QDRANT_WRITE_RETRY_MAX_S', '30'))
+WRITE_ERROR_LOG_INTERVAL_S = 60
+# Recency-aware conversation search: score * (1 - w + w * decay(age)), where
+# decay halves every CONVERSATION_HALF_LIFE_DAYS.  w = 0 ranks by similarity only.
+CONVERSATION_DECAY_WEIGHT = float(os.getenv('CONVERSATION_DECAY_WEIGHT', '0.3'))
+CONVERSATION_HALF_LIFE_DAYS = float(os.getenv('CONVERSATION_HALF_LIFE_DAYS', '30'))
+
+_client: AsyncQdrantClient | None = None
 
 # Collection names
 CONVERSATIONS = 'conversations'
 MEMORIES = 'memories'
 HISTORY_SNAPSHOTS = 'history_snapshots'
+HISTORY_LOG = 'history_log'
 ALARMS = 'alarms'
 BRIEFINGS = 'briefings'
 MEMOS = 'memos'
 
-
-def get_client() -> QdrantClient:
-    """Get or create Qdrant client singleton."""
+# Points per scroll request when reading whole collections
+SCROLL_PAGE_SIZE = 256
+
+# Payload indexes per collection — every field the code filters on
+PAYLOAD_INDEXES: dict[str, dict[str, PayloadSchemaType]] = {
+    CONVERSATIONS: {'chat_id': PayloadSchemaType.INTEGER, 'timestamp': PayloadSchemaType.DATETIME},
+    MEMORIES: {'category': PayloadSchemaType.KEYWORD, 'timestamp': PayloadSchemaType.DATETIME},
+    MEMOS: {
+        'chat_id': PayloadSchemaType.INTEGER,
+        'active': PayloadSchemaType.BOOL,
+        'category': PayloadSchemaType.KEYWORD,
+        'timestamp': PayloadSchemaType.DATETIME,
+    },
+    HISTORY_SNAPSHOTS: {'chat_id': PayloadSchemaType.INTEGER},
+    HISTORY_LOG: {'chat_id': PayloadSchemaType.INTEGER, 'seq': PayloadSchemaType.INTEGER},
+    ALARMS: {'chat_id': PayloadSchemaType.INTEGER, 'active': PayloadSchemaType.BOOL},
+    BRIEFINGS: {'active': PayloadSchemaType.BOOL},
+}
+
+
+def get_client() -> AsyncQdrantClient:
+    """Get or create the async Qdrant client singleton (pooled keep-alive connections)."""
     global _client
     if _client is None:
-        _client = QdrantClient(url=QDRANT_URL, timeout=10)
-        logger.info('Connected to Qdrant at %s', QDRANT_URL)
+        _client = AsyncQdrantClient(
+            url=QDRANT_URL,
+            timeout=10,
+            limits=httpx.Limits(
+                max_connections=QDRANT_POOL_SIZE,
+                max_keepalive_connections=QDRANT_POOL_SIZE,
+            ),
+        )
+        logger.info('Connected to Qdrant at %s (pool=%d)', QDRANT_URL, QDRANT_POOL_SIZE)
     return _client
 
 
-def ensure_collections() -> None:
-    """Create collections if they don't exist."""
+async def close_client() -> None:
+    """Flush buffered writes and close the pooled connections (called on bot shutdown)."""
+    global _client
+    if _client is not None:
+        try:
+            await flush_writes()
+        except Exception:
+            logger.error('Dropping %d buffered point(s) on shutdown — Qdrant unreachable', _writes.stats()['pending'])
+        await _client.close()
+        _client = None
+
+
+async def ensure_payload_indexes(collection: str) -> None:
+    """Create missing payload indexes (and rebuild ones with the wrong type)."""
     client = get_client()
-    existing = {c.name for c in client.get_collections().collections}
+    schema = (await client.get_collection(collection)).payload_schema or {}
+    for field, field_type in PAYLOAD_INDEXES.get(collection, {}).items():
+        current = schema.get(field)
+        if current is not None and current.data_type == field_type:
+            continue
+        if current is not None:
+            logger.warning(
+                'Payload index %s.%s is %s, expected %s — rebuilding',
+                collection, field, current.data_type, field_type,
+            )
+            await client.delete_payload_index(collection, field, wait=True)
+        await client.create_payload_index(collection, field, field_schema=field_type, wait=True)
+        logger.info('Created payload index: %s.%s (%s)', collection, field, field_type.value)
+
+
+@timed('qdrant', 'ensure_collections')
+async def ensure_collections(state_collections: bool = True) -> None:
+    """Create collections and their payload indexes if they don't exist.
+
+    state_collections: also create the dummy-vector history/alarm/briefing
+    collections (only needed when STATE_STORE=qdrant).
+    """
+    client = get_client()
+    existing = {c.name for c in (await client.get_collections()).collections}
 
     vector_collections = {
         CONVERSATIONS: EMBEDDING_DIM,
@@ -52,105 +153,418 @@ def ensure_collections() -> None:
     }
     for name, dim in vector_collections.items():
         if name not in existing:
-            client.create_collection(
+            await client.create_collection(
                 collection_name=name,
                 vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
             )
             logger.info('Created collection: %s', name)
+        await ensure_payload_indexes(name)
 
     # memos use real vectors (same dim as conversations/memories)
     if MEMOS not in existing:
-        client.create_collection(
+        await client.create_collection(
             collection_name=MEMOS,
             vectors_config=VectorParams(size=EMBEDDING_DIM, distance=Distance.COSINE),
         )
         logger.info('Created collection: %s', MEMOS)
+    await ensure_payload_indexes(MEMOS)
+
+    if not state_collections:
+        return
 
-    # history_snapshots, alarms, briefings don't need real vectors — use dim=1 dummy
-    for name in (HISTORY_SNAPSHOTS, ALARMS, BRIEFINGS):
+    # history_snapshots/log, alarms, briefings don't need real vectors — use dim=1 dummy
+    for name in (HISTORY_SNAPSHOTS, HISTORY_LOG, ALARMS, BRIEFINGS):
         if name not in existing:
-            client.create_collection(
+            await client.create_collection(
                 collection_name=name,
                 vectors_config=VectorParams(size=1, distance=Distance.COSINE),
             )
             logger.info('Created collection: %s', name)
+        await ensure_payload_indexes(name)
+
+
+# ── write-behind buffer ──
+# Upserts of conversations, memories, memos and history land here and are sent
+# as one batched upsert per collection.  A newer write to the same point id
+# replaces the pending one.  Reads that must see their own writes (memos,
+# history) and deletes/payload updates flush the buffer first.
+
+
+class _WriteBuffer:
+    def __init__(self, flush_ms: float, batch_size: int, max_pending: int, retry_max_s: float) -> None:
+        self.flush_ms = flush_ms
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.retry_max_s = retry_max_s
+        self._pending: dict[str, dict[str, tuple[list[float], dict]]] = defaultdict(dict)
+        self._lock = asyncio.Lock()  # one flush at a time keeps writes in order
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        # Delay before the next background retry; 0 while Qdrant is healthy
+        self._backoff = 0.0
+        self._last_error_log = 0.0
+        # Metrics
+        self.points = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.requests = 0
+        self.max_batch = 0
+        self.failed = 0
+
+    def _size(self) -> int:
+        return sum(len(p) for p in self._pending.values())
+
+    async def add(self, collection: str, ids: list[str], vectors: list[list[float]], payloads: list[dict]) -> None:
+        if self._size() + len(ids) > self.max_pending:
+            # Full (Qdrant down or slow): push it out now; a failure reaches the caller
+            await self.flush()
+        pending = self._pending[collection]
+        for point_id, vector, payload in zip(ids, vectors, payloads):
+            if point_id in pending:
+                self.coalesced += 1
+            pending[point_id] = (vector, payload)
+            self.points += 1
+        if self._size() >= self.batch_size and not self._backoff:
+            self._spawn_flush()
+        else:
+            self._arm()
+
+    def _arm(self) -> None:
+        if self._timer is None:
+            delay = self._backoff or self.flush_ms / 1000
+            self._timer = asyncio.get_running_loop().call_later(delay, self._spawn_flush)
+
+    def _spawn_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = asyncio.create_task(self._background_flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _background_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            pass  # logged in flush(); the points are re-queued and retried after the backoff
+
+    async def flush(self, collection: str | None = None) -> None:
+        """Send pending points (of one collection, or all).
+
+        Failed batches are re-queued for a later retry and the error is raised,
+        so callers that need the write to have landed don't carry on.  A batch
+        interrupted by cancellation is re-queued as well.
+        """
+        async with self._lock:
+            names = [collection] if collection is not None else list(self._pending)
+            error: Exception | None = None
+            for name in names:
+                points = self._pending.pop(name, None)
+                if not points:
+                    continue
+                ids = list(points)
+                sent = False
+                try:
+                    with timed('qdrant', 'write_flush'):
+                        await get_client().upsert(
+                            collection_name=name,
+                            points=Batch(
+                                ids=ids,
+                                vectors=[v for v, _ in points.values()],
+                                payloads=[p for _, p in points.values()],
+                            ),
+                        )
+                    sent = True
+                    self.requests += 1
+                    self.max_batch = max(self.max_batch, len(ids))
+                    self._backoff = 0.0
+                except Exception as e:
+                    error = e
+                    self.failed += 1
+                    self._backoff = min(self.retry_max_s, (self._backoff * 2) or self.flush_ms / 1000)
+                    self._log_failure(len(ids), name)
+                finally:
+                    # Failed or cancelled mid-upsert: put the batch back (newer writes win)
+                    if not sent:
+                        pending = self._pending[name]
+                        for point_id, item in points.items():
+                            pending.setdefault(point_id, item)
+                        self._arm()
+            self.flushes += 1
+            if any(self._pending.values()):
+                self._arm()
+            if error is not None:
+                raise error
+
+    def _log_failure(self, count: int, collection: str) -> None:
+        now = time.monotonic()
+        if now - self._last_error_log >= WRITE_ERROR_LOG_INTERVAL_S:
+            self._last_error_log = now
+            logger.error(
+                'Buffered upsert of %d point(s) to %s failed — retrying in %.1fs (%d pending, %d failures so far)',
+                count, collection, self._backoff, self._size(), self.failed, exc_info=True,
+            )
+
+    def stats(self) -> dict:
+        return {
+            'pending': self._size(),
+            'points': self.points,
+            'coalesced': self.coalesced,
+            'requests': self.requests,
+            'points_per_request': round((self.points - self.coalesced) / self.requests, 2) if self.requests else 0.0,
+            'max_batch': self.max_batch,
+            'failed': self.failed,
+            'backoff_s': self._backoff,
+        }
+
+
+_writes = _WriteBuffer(
+    QDRANT_WRITE_FLUSH_MS, QDRANT_WRITE_BATCH_SIZE, QDRANT_WRITE_MAX_PENDING, QDRANT_WRITE_RETRY_MAX_S,
+)
+
+
+async def flush_writes(collection: str | None = None) -> None:
+    """Push buffered upserts to Qdrant now. Raises if a batch failed (it stays queued)."""
+    await _writes.flush(collection)
+
+
+def write_stats() -> dict:
+    return _writes.stats()
+
+
+# ── vector helpers ──
+# Vectors stay float32 ndarrays end to end; the single .tolist() for the REST
+# body happens here, once per request, on the whole (n, dim) block.
+
+
+async def _upsert_vectors(
+    collection: str, ids: list[str], vectors: np.ndarray, payloads: list[dict]
+) -> None:
+    """Queue n points from an (n, dim) array on the write-behind buffer."""
+    await _writes.add(collection, ids, np.asarray(vectors, dtype=np.float32).tolist(), payloads)
+
+
+async def _query_many(
+    collection: str, vectors: np.ndarray, limit: int, query_filter: Filter | None = None
+) -> list[list[dict]]:
+    """Run one query per row of an (n, dim) array in a single query_batch_points call."""
+    responses = await get_client().query_batch_points(
+        collection_name=collection,
+        requests=[
+            QueryRequest(query=v, filter=query_filter, limit=limit, with_payload=True)
+            for v in np.asarray(vectors, dtype=np.float32).tolist()
+        ],
+    )
+    return [[{**p.payload, 'score': p.score} for p in r.points] for r in responses]
+
+
+async def scroll_pages(
+    collection: str,
+    scroll_filter: Filter | None = None,
+    page_size: int = SCROLL_PAGE_SIZE,
+) -> AsyncIterator[list[dict]]:
+    """Yield payloads page by page, following next_page_offset to the end."""
+    offset = None
+    while True:
+        with timed('qdrant', 'scroll'):
+            points, offset = await get_client().scroll(
+                collection_name=collection,
+                scroll_filter=scroll_filter,
+                limit=page_size,
+                offset=offset,
+                with_vectors=False,
+            )
+        if points:
+            yield [p.payload for p in points]
+        if offset is None:
+            return
 
 
 # ── conversations ──
 
 
-def upsert_conversation(
-    vector: list[float],
+@timed('qdrant', 'upsert_conversation')
+async def upsert_conversation(
+    vector: np.ndarray,
     chat_id: int,
     user_text: str,
     assistant_text: str,
 ) -> str:
-    point_id = str(uuid.uuid4())
-    get_client().upsert(
-        collection_name=CONVERSATIONS,
-        points=[
-            PointStruct(
-                id=point_id,
-                vector=vector,
-                payload={
-                    'chat_id': chat_id,
-                    'user_text': user_text,
-                    'assistant_text': assistant_text,
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                },
-            )
+    ids = await upsert_conversations(vector[None], chat_id, [(user_text, assistant_text)])
+    return ids[0]
+
+
+@timed('qdrant', 'upsert_conversations')
+async def upsert_conversations(
+    vectors: np.ndarray,
+    chat_id: int,
+    turns: list[tuple[str, str]],
+) -> list[str]:
+    """Store several (user_text, assistant_text) turns of a chat in one request."""
+    point_ids = [str(uuid.uuid4()) for _ in turns]
+    now = datetime.now(timezone.utc).isoformat()
+    await _upsert_vectors(
+        CONVERSATIONS,
+        point_ids,
+        vectors,
+        [
+            {
+                'chat_id': chat_id,
+                'user_text': pack(user_text),
+                'assistant_text': pack(assistant_text),
+                'timestamp': now,
+            }
+            for user_text, assistant_text in turns
         ],
     )
-    return point_id
+    return point_ids
+
+
+def _recency_formula(weight: float, half_life_days: float) -> FormulaQuery:
+    """$score * (1 - w + w * exp_decay(timestamp)), decay = 0.5 at one half-life."""
+    return FormulaQuery(
+        formula=MultExpression(mult=[
+            '$score',
+            SumExpression(sum=[
+                1 - weight,
+                MultExpression(mult=[
+                    weight,
+                    ExpDecayExpression(exp_decay=DecayParamsExpression(
+                        x=DatetimeKeyExpression(datetime_key='timestamp'),
+                        target=DatetimeExpression(datetime=datetime.now(timezone.utc).isoformat()),
+                        scale=half_life_days * 86400,
+                        midpoint=0.5,
+                    )),
+                ]),
+            ]),
+        ]),
+    )
 
 
-def search_conversations(
-    vector: list[float], chat_id: int, limit: int = 3
+@timed('qdrant', 'search_conversations')
+async def search_conversations(
+    vector: np.ndarray, chat_id: int, limit: int = 3
 ) -> list[dict]:
-    results = get_client().query_points(
-        collection_name=CONVERSATIONS,
-        query=vector,
-        query_filter=Filter(
-            must=[FieldCondition(key='chat_id', match=MatchValue(value=chat_id))]
-        ),
-        limit=limit,
-    )
+    """Past turns of a chat, by similarity discounted for age (CONVERSATION_DECAY_WEIGHT)."""
+    by_chat = Filter(must=[FieldCondition(key='chat_id', match=MatchValue(value=chat_id))])
+    if CONVERSATION_DECAY_WEIGHT > 0:
+        # Re-rank a wider similarity shortlist by the recency formula
+        results = await get_client().query_points(
+            collection_name=CONVERSATIONS,
+            prefetch=Prefetch(query=vector, filter=by_chat, limit=max(limit * 5, 20)),
+            query=_recency_formula(CONVERSATION_DECAY_WEIGHT, CONVERSATION_HALF_LIFE_DAYS),
+            limit=limit,
+        )
+    else:
+        results = await get_client().query_points(
+            collection_name=CONVERSATIONS,
+            query=vector,
+            query_filter=by_chat,
+            limit=limit,
+        )
     return [
-        {**p.payload, 'score': p.score}
+        {
+            **p.payload,
+            'user_text': unpack(p.payload.get('user_text')),
+            'assistant_text': unpack(p.payload.get('assistant_text')),
+            'score': p.score,
+        }
         for p in results.points
     ]
 
 
+@timed('qdrant', 'expire_conversations')
+async def expire_conversations(older_than_days: float) -> None:
+    """Delete conversation turns older than the retention window."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    await flush_writes(CONVERSATIONS)
+    await get_client().delete(
+        collection_name=CONVERSATIONS,
+        points_selector=FilterSelector(filter=Filter(
+            must=[FieldCondition(key='timestamp', range=DatetimeRange(lt=cutoff))]
+        )),
+    )
+
+
+@timed('qdrant', 'conversation_counts')
+async def conversation_counts(limit: int = 10000) -> dict[int, int]:
+    """Number of stored turns per chat_id (facet over the chat_id index)."""
+    await flush_writes(CONVERSATIONS)
+    response = await get_client().facet(
+        collection_name=CONVERSATIONS, key='chat_id', limit=limit, exact=True,
+    )
+    return {int(hit.value): hit.count for hit in response.hits}
+
+
+@timed('qdrant', 'trim_conversations')
+async def trim_conversations(chat_id: int, excess: int) -> int:
+    """Delete a chat's `excess` oldest turns. Returns how many were deleted."""
+    points, _ = await get_client().scroll(
+        collection_name=CONVERSATIONS,
+        scroll_filter=Filter(must=[FieldCondition(key='chat_id', match=MatchValue(value=chat_id))]),
+        order_by=OrderBy(key='timestamp', direction=Direction.ASC),
+        limit=excess,
+        with_payload=False,
+        with_vectors=False,
+    )
+    if points:
+        await get_client().delete(
+            collection_name=CONVERSATIONS,
+            points_selector=PointIdsList(points=[p.id for p in points]),
+        )
+    return len(points)
+
+
 # ── memories ──
 
 
-def upsert_memory(
-    vector: list[float],
+@timed('qdrant', 'upsert_memory')
+async def upsert_memory(
+    vector: np.ndarray,
     content: str,
     category: str,
     confidence: float,
 ) -> str:
     point_id = str(uuid.uuid4())
-    get_client().upsert(
-        collection_name=MEMORIES,
-        points=[
-            PointStruct(
-                id=point_id,
-                vector=vector,
-                payload={
-                    'content': content,
-                    'category': category,
-                    'confidence': confidence,
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                },
-            )
-        ],
+    await _upsert_vectors(
+        MEMORIES,
+        [point_id],
+        vector[None],
+        [{
+            'content': content,
+            'category': category,
+            'confidence': confidence,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        }],
     )
     return point_id
 
 
-def search_memories(vector: list[float], limit: int = 5) -> list[dict]:
-    results = get_client().query_points(
+@timed('qdrant', 'upsert_memories')
+async def upsert_memories(vectors: np.ndarray, items: list[dict]) -> list[str]:
+    """Insert several memories in one request. items: content/category/confidence dicts."""
+    point_ids = [str(uuid.uuid4()) for _ in items]
+    now = datetime.now(timezone.utc).isoformat()
+    await _upsert_vectors(
+        MEMORIES,
+        point_ids,
+        vectors,
+        [
+            {
+                'content': item['content'],
+                'category': item['category'],
+                'confidence': item['confidence'],
+                'timestamp': now,
+            }
+            for item in items
+        ],
+    )
+    return point_ids
+
+
+@timed('qdrant', 'search_memories')
+async def search_memories(vector: np.ndarray, limit: int = 5) -> list[dict]:
+    results = await get_client().query_points(
         collection_name=MEMORIES,
         query=vector,
         limit=limit,
@@ -161,57 +575,132 @@ def search_memories(vector: list[float], limit: int = 5) -> list[dict]:
     ]
 
 
+@timed('qdrant', 'search_memories_batch')
+async def search_memories_batch(vectors: np.ndarray, limit: int = 1) -> list[list[dict]]:
+    """Nearest memories for each row of vectors, in one batched query."""
+    return await _query_many(MEMORIES, vectors, limit)
+
+
 # ── history_snapshots ──
 
 
-def save_history_snapshot(chat_id: int, messages_json: str) -> None:
-    """Upsert a single snapshot per chat_id (deterministic ID)."""
+@timed('qdrant', 'save_history_snapshot')
+async def save_history_snapshot(chat_id: int, messages_json: str, seq: int = 0) -> None:
+    """Upsert a single snapshot per chat_id (deterministic ID).
+
+    seq is the last history_log sequence number the snapshot already includes.
+    """
     # Use a deterministic point ID based on chat_id so upsert overwrites
     point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f'history-{chat_id}'))
-    get_client().upsert(
-        collection_name=HISTORY_SNAPSHOTS,
-        points=[
-            PointStruct(
-                id=point_id,
-                vector=[0.0],  # dummy
-                payload={
-                    'chat_id': chat_id,
-                    'messages_json': messages_json,
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                },
-            )
-        ],
+    await _writes.add(
+        HISTORY_SNAPSHOTS,
+        [point_id],
+        [[0.0]],  # dummy
+        [{
+            'chat_id': chat_id,
+            'messages_json': pack(messages_json),
+            'seq': seq,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        }],
     )
 
 
-def load_history_snapshot(chat_id: int) -> str | None:
+@timed('qdrant', 'load_history_snapshot')
+async def load_history_snapshot(chat_id: int) -> str | None:
     """Load history snapshot for a chat. Returns JSON string or None."""
     point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f'history-{chat_id}'))
-    results = get_client().retrieve(
+    await flush_writes(HISTORY_SNAPSHOTS)
+    results = await get_client().retrieve(
         collection_name=HISTORY_SNAPSHOTS,
         ids=[point_id],
     )
     if results:
-        return results[0].payload.get('messages_json')
+        return unpack(results[0].payload.get('messages_json'))
     return None
 
 
-def load_all_history_snapshots() -> list[dict]:
-    """Load all history snapshots (for restore on startup)."""
-    results = get_client().scroll(
-        collection_name=HISTORY_SNAPSHOTS,
-        limit=1000,
+def _snapshot_row(payload: dict) -> dict:
+    return {
+        'chat_id': payload['chat_id'],
+        'messages_json': unpack(payload['messages_json']),
+        'seq': payload.get('seq', 0),
+    }
+
+
+async def iter_history_snapshots(page_size: int = SCROLL_PAGE_SIZE) -> AsyncIterator[list[dict]]:
+    """Yield all history snapshots in pages (for restore on startup)."""
+    await flush_writes(HISTORY_SNAPSHOTS)
+    async for page in scroll_pages(HISTORY_SNAPSHOTS, page_size=page_size):
+        yield [_snapshot_row(p) for p in page]
+
+
+@timed('qdrant', 'load_history')
+async def load_history(chat_id: int) -> tuple[dict | None, list[dict]]:
+    """Load one chat's snapshot row and its log entries (for lazy restore)."""
+    point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f'history-{chat_id}'))
+    await flush_writes(HISTORY_SNAPSHOTS)
+    results = await get_client().retrieve(collection_name=HISTORY_SNAPSHOTS, ids=[point_id])
+    if not results:
+        return None, []
+    return _snapshot_row(results[0].payload), await load_history_logs([chat_id])
+
+
+# ── history_log (append-only tail on top of the snapshot) ──
+
+
+@timed('qdrant', 'append_history_log')
+async def append_history_log(chat_id: int, seq: int, messages_json: str) -> None:
+    """Append one turn's new messages for a chat."""
+    point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f'history-log-{chat_id}-{seq}'))
+    await _writes.add(
+        HISTORY_LOG,
+        [point_id],
+        [[0.0]],  # dummy
+        [{
+            'chat_id': chat_id,
+            'seq': seq,
+            'messages_json': pack(messages_json),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        }],
+    )
+
+
+@timed('qdrant', 'load_history_logs')
+async def load_history_logs(chat_ids: list[int]) -> list[dict]:
+    """Load the log entries of the given chats. Unordered."""
+    await flush_writes(HISTORY_LOG)
+    entries = []
+    async for page in scroll_pages(
+        HISTORY_LOG,
+        scroll_filter=Filter(must=[FieldCondition(key='chat_id', match=MatchAny(any=chat_ids))]),
+    ):
+        entries.extend(
+            {'chat_id': p['chat_id'], 'seq': p['seq'], 'messages_json': unpack(p['messages_json'])} for p in page
+        )
+    return entries
+
+
+@timed('qdrant', 'delete_history_log')
+async def delete_history_log(chat_id: int, upto_seq: int | None = None) -> None:
+    """Delete a chat's log entries with seq <= upto_seq (all of them if None)."""
+    must = [FieldCondition(key='chat_id', match=MatchValue(value=chat_id))]
+    if upto_seq is not None:
+        must.append(FieldCondition(key='seq', range=Range(lte=upto_seq)))
+    # The snapshot that supersedes these entries must land before they go, and
+    # buffered entries must not be re-created after the delete; raises otherwise
+    await flush_writes(HISTORY_SNAPSHOTS)
+    await flush_writes(HISTORY_LOG)
+    await get_client().delete(
+        collection_name=HISTORY_LOG,
+        points_selector=FilterSelector(filter=Filter(must=must)),
     )
-    return [
-        {'chat_id': p.payload['chat_id'], 'messages_json': p.payload['messages_json']}
-        for p in results[0]
-    ]
 
 
 # ── alarms ──
 
 
-def save_alarm(
+@timed('qdrant', 'save_alarm')
+async def save_alarm(
     alarm_id: str,
     chat_id: int,
     message: str,
@@ -219,7 +708,7 @@ def save_alarm(
     repeat: str | None = None,
 ) -> None:
     point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f'alarm-{alarm_id}'))
-    get_client().upsert(
+    await get_client().upsert(
         collection_name=ALARMS,
         points=[
             PointStruct(
@@ -238,34 +727,34 @@ def save_alarm(
     )
 
 
-def deactivate_alarm(alarm_id: str) -> None:
+@timed('qdrant', 'deactivate_alarm')
+async def deactivate_alarm(alarm_id: str) -> None:
     point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f'alarm-{alarm_id}'))
-    get_client().set_payload(
+    await get_client().set_payload(
         collection_name=ALARMS,
         payload={'active': False},
         points=[point_id],
     )
 
 
-def load_active_alarms() -> list[dict]:
-    """Load all active alarms (for restore on startup)."""
-    results = get_client().scroll(
-        collection_name=ALARMS,
-        scroll_filter=Filter(
-            must=[FieldCondition(key='active', match=MatchValue(value=True))]
-        ),
-        limit=1000,
-    )
-    return [p.payload for p in results[0]]
+async def iter_active_alarms(page_size: int = SCROLL_PAGE_SIZE) -> AsyncIterator[list[dict]]:
+    """Yield all active alarms in pages (for restore on startup)."""
+    async for page in scroll_pages(
+        ALARMS,
+        scroll_filter=Filter(must=[FieldCondition(key='active', match=MatchValue(value=True))]),
+        page_size=page_size,
+    ):
+        yield page
 
 
 # ── briefings ──
 
 
-def save_briefing(chat_id: int, time: str) -> None:
+@timed('qdrant', 'save_briefing')
+async def save_briefing(chat_id: int, time: str) -> None:
     """Save or overwrite briefing setting for a chat (one per chat_id)."""
     point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f'briefing-{chat_id}'))
-    get_client().upsert(
+    await get_client().upsert(
         collection_name=BRIEFINGS,
         points=[
             PointStruct(
@@ -281,10 +770,11 @@ def save_briefing(chat_id: int, time: str) -> None:
     )
 
 
-def load_briefing(chat_id: int) -> dict | None:
+@timed('qdrant', 'load_briefing')
+async def load_briefing(chat_id: int) -> dict | None:
     """Load briefing setting for a chat. Returns payload dict or None."""
     point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f'briefing-{chat_id}'))
-    results = get_client().retrieve(
+    results = await get_client().retrieve(
         collection_name=BRIEFINGS,
         ids=[point_id],
     )
@@ -293,64 +783,67 @@ def load_briefing(chat_id: int) -> dict | None:
     return None
 
 
-def deactivate_briefing(chat_id: int) -> None:
+@timed('qdrant', 'deactivate_briefing')
+async def deactivate_briefing(chat_id: int) -> None:
     """Deactivate briefing for a chat."""
     point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f'briefing-{chat_id}'))
-    get_client().set_payload(
+    await get_client().set_payload(
         collection_name=BRIEFINGS,
         payload={'active': False},
         points=[point_id],
     )
 
 
-def load_active_briefings() -> list[dict]:
-    """Load all active briefings (for restore on startup)."""
-    results = get_client().scroll(
-        collection_name=BRIEFINGS,
-        scroll_filter=Filter(
-            must=[FieldCondition(key='active', match=MatchValue(value=True))]
-        ),
-        limit=1000,
-    )
-    return [p.payload for p in results[0]]
+async def iter_active_briefings(page_size: int = SCROLL_PAGE_SIZE) -> AsyncIterator[list[dict]]:
+    """Yield all active briefings in pages (for restore on startup)."""
+    async for page in scroll_pages(
+        BRIEFINGS,
+        scroll_filter=Filter(must=[FieldCondition(key='active', match=MatchValue(value=True))]),
+        page_size=page_size,
+    ):
+        yield page
 
 
 # ── memos ──
 
 
-def save_memo(
-    vector: list[float],
+@timed('qdrant', 'save_memo')
+async def save_memo(
+    vector: np.ndarray,
     chat_id: int,
     content: str,
     category: str = 'memo',
 ) -> str:
     """Save a memo with embedding vector. Returns memo_id."""
     memo_id = str(uuid.uuid4())
-    get_client().upsert(
-        collection_name=MEMOS,
-        points=[
-            PointStruct(
-                id=memo_id,
-                vector=vector,
-                payload={
-                    'memo_id': memo_id,
-                    'chat_id': chat_id,
-                    'content': content,
-                    'category': category,
-                    'active': True,
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                },
-            )
-        ],
+    await _upsert_vectors(
+        MEMOS,
+        [memo_id],
+        vector[None],
+        [{
+            'memo_id': memo_id,
+            'chat_id': chat_id,
+            'content': content,
+            'category': category,
+            'active': True,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        }],
     )
+    # The tool confirms the save to the user, so it must actually have landed
+    await flush_writes(MEMOS)
     return memo_id
 
 
-def search_memos(
-    vector: list[float], chat_id: int, limit: int = 5
+@timed('qdrant', 'search_memos')
+async def search_memos(
+    vector: np.ndarray, chat_id: int, limit: int = 5
 ) -> list[dict]:
-    """Semantic search memos for a chat."""
-    results = get_client().query_points(
+    """Semantic search memos for a chat.
+
+    No flush here: this runs on the retrieval path, and save_memo already
+    flushes before it returns.
+    """
+    results = await get_client().query_points(
         collection_name=MEMOS,
         query=vector,
         query_filter=Filter(
@@ -364,9 +857,11 @@ def search_memos(
     return [{**p.payload, 'score': p.score} for p in results.points]
 
 
-def list_memos(chat_id: int) -> list[dict]:
+@timed('qdrant', 'list_memos')
+async def list_memos(chat_id: int) -> list[dict]:
     """List all active memos for a chat."""
-    results = get_client().scroll(
+    await flush_writes(MEMOS)
+    results = await get_client().scroll(
         collection_name=MEMOS,
         scroll_filter=Filter(
             must=[
@@ -379,10 +874,12 @@ def list_memos(chat_id: int) -> list[dict]:
     return [p.payload for p in results[0]]
 
 
-def delete_memo(memo_id: str) -> bool:
+@timed('qdrant', 'delete_memo')
+async def delete_memo(memo_id: str) -> bool:
     """Deactivate a memo. Returns True if found."""
     try:
-        get_client().set_payload(
+        await flush_writes(MEMOS)
+        await get_client().set_payload(
             collection_name=MEMOS,
             payload={'active': False},
             points=[memo_id],
@@ -0,0 +1,419 @@
+"""Non-vector state store — chat history, alarms, briefings.
+
+Two backends behind the same async interface, picked by STATE_STORE:
+
+- ``sqlite`` (default): embedded SQLite in WAL mode, indexed on chat_id /
+  active / fire_at, local millisecond reads.  Runs on a dedicated
+  single-thread executor so the event loop never blocks on disk.
+- ``qdrant``: the legacy layout — payload-only collections with a dummy
+  1-dim vector, delegated to memory.qdrant_store.
+
+The SQLite store imports the legacy Qdrant collections until one import has
+completed (recorded in the meta table), so switching backends keeps existing
+histories, alarms and briefings even if Qdrant was down on the first boot.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Protocol
+
+from memory import qdrant_store as qs
+from memory.compression import from_blob, to_blob
+
+logger = logging.getLogger(__name__)
+
+STATE_STORE = os.getenv('STATE_STORE', 'sqlite')  # sqlite | qdrant
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', '/data/state.db')
+# Rows per page when streaming whole tables/collections at startup
+STATE_PAGE_SIZE = int(os.getenv('STATE_PAGE_SIZE', '256'))
+
+
+class StateStore(Protocol):
+    async def init(self) -> None: ...
+    async def close(self) -> None: ...
+
+    # history
+    async def compact_history(
+        self, chat_id: int, messages_json: str, seq: int, delete_log_upto: int | None
+    ) -> None: ...
+    async def append_history_log(self, chat_id: int, seq: int, messages_json: str) -> None: ...
+    def iter_history_snapshots(self, page_size: int = STATE_PAGE_SIZE) -> AsyncIterator[list[dict]]: ...
+    async def load_history_logs(self, chat_ids: list[int]) -> list[dict]: ...
+    async def load_history(self, chat_id: int) -> tuple[dict | None, list[dict]]: ...
+    async def flush_history(self) -> None: ...
+
+    # alarms
+    async def save_alarm(
+        self, alarm_id: str, chat_id: int, message: str, fire_at: str, repeat: str | None = None
+    ) -> None: ...
+    async def deactivate_alarm(self, alarm_id: str) -> None: ...
+    def iter_active_alarms(self, page_size: int = STATE_PAGE_SIZE) -> AsyncIterator[list[dict]]: ...
+
+    # briefings
+    async def save_briefing(self, chat_id: int, time: str) -> None: ...
+    async def load_briefing(self, chat_id: int) -> dict | None: ...
+    async def deactivate_briefing(self, chat_id: int) -> None: ...
+    def iter_active_briefings(self, page_size: int = STATE_PAGE_SIZE) -> AsyncIterator[list[dict]]: ...
+
+
+class QdrantStateStore:
+    """Legacy backend — dummy-vector Qdrant collections."""
+
+    async def init(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def compact_history(
+        self, chat_id: int, messages_json: str, seq: int, delete_log_upto: int | None
+    ) -> None:
+        await qs.save_history_snapshot(chat_id, messages_json, seq=seq)
+        await qs.delete_history_log(chat_id, upto_seq=delete_log_upto)
+
+    async def append_history_log(self, chat_id: int, seq: int, messages_json: str) -> None:
+        await qs.append_history_log(chat_id, seq, messages_json)
+
+    def iter_history_snapshots(self, page_size: int = STATE_PAGE_SIZE) -> AsyncIterator[list[dict]]:
+        return qs.iter_history_snapshots(page_size)
+
+    async def load_history_logs(self, chat_ids: list[int]) -> list[dict]:
+        return await qs.load_history_logs(chat_ids)
+
+    async def load_history(self, chat_id: int) -> tuple[dict | None, list[dict]]:
+        return await qs.load_history(chat_id)
+
+    async def flush_history(self) -> None:
+        """History writes go through the write-behind buffer; make them land (raises on failure)."""
+        await qs.flush_writes(qs.HISTORY_SNAPSHOTS)
+        await qs.flush_writes(qs.HISTORY_LOG)
+
+    async def save_alarm(
+        self, alarm_id: str, chat_id: int, message: str, fire_at: str, repeat: str | None = None
+    ) -> None:
+        await qs.save_alarm(alarm_id, chat_id, message, fire_at, repeat)
+
+    async def deactivate_alarm(self, alarm_id: str) -> None:
+        await qs.deactivate_alarm(alarm_id)
+
+    def iter_active_alarms(self, page_size: int = STATE_PAGE_SIZE) -> AsyncIterator[list[dict]]:
+        return qs.iter_active_alarms(page_size)
+
+    async def save_briefing(self, chat_id: int, time: str) -> None:
+        await qs.save_briefing(chat_id, time)
+
+    async def load_briefing(self, chat_id: int) -> dict | None:
+        return await qs.load_briefing(chat_id)
+
+    async def deactivate_briefing(self, chat_id: int) -> None:
+        await qs.deactivate_briefing(chat_id)
+
+    def iter_active_briefings(self, page_size: int = STATE_PAGE_SIZE) -> AsyncIterator[list[dict]]:
+        return qs.iter_active_briefings(page_size)
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS history_snapshots (
+    chat_id INTEGER PRIMARY KEY,
+    messages_json TEXT NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history_log (
+    chat_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    messages_json TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (chat_id, seq)
+);
+CREATE TABLE IF NOT EXISTS alarms (
+    alarm_id TEXT PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    fire_at TEXT NOT NULL,
+    repeat TEXT,
+    active INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_alarms_chat_id ON alarms (chat_id);
+CREATE INDEX IF NOT EXISTS idx_alarms_active_fire_at ON alarms (active, fire_at);
+CREATE TABLE IF NOT EXISTS briefings (
+    chat_id INTEGER PRIMARY KEY,
+    time TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_briefings_active ON briefings (active);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+# meta key set once the legacy Qdrant import has gone through
+IMPORT_DONE_KEY = 'qdrant_import_done'
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _decoded(rows: list[dict]) -> list[dict]:
+    """Decompress the messages_json column (stored as a BLOB when large)."""
+    return [{**r, 'messages_json': from_blob(r['messages_json'])} for r in rows]
+
+
+class SqliteStateStore:
+    """Embedded SQLite (WAL) backend. All access goes through one worker thread."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='state-db')
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connect(self) -> bool:
+        """Open + migrate schema. Returns True if the legacy import has already completed."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+        return conn.execute('SELECT 1 FROM meta WHERE key = ?', (IMPORT_DONE_KEY,)).fetchone() is not None
+
+    async def init(self) -> None:
+        imported = await self._run(self._connect)
+        logger.info('State store: SQLite at %s', self.path)
+        if not imported:
+            await import_from_qdrant(self)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    def _execute(self, sql: str, params: tuple = ()) -> None:
+        with self._conn:
+            self._conn.execute(sql, params)
+
+    def _fetchall(self, sql: str, params: tuple = ()) -> list[dict]:
+        return [dict(row) for row in self._conn.execute(sql, params)]
+
+    async def _iter_pages(
+        self, select: str, key: str, page_size: int, where: str = '1'
+    ) -> AsyncIterator[list[dict]]:
+        """Keyset pagination over a table ordered by a unique key column."""
+        last = None
+        while True:
+            if last is None:
+                sql, params = f'{select} WHERE {where} ORDER BY {key} LIMIT ?', (page_size,)
+            else:
+                sql, params = f'{select} WHERE {where} AND {key} > ? ORDER BY {key} LIMIT ?', (last, page_size)
+            rows = await self._run(self._fetchall, sql, params)
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            last = rows[-1][key]
+
+    # ── history ──
+
+    def _compact_history(
+        self, chat_id: int, messages_json: str, seq: int, delete_log_upto: int | None
+    ) -> None:
+        with self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO history_snapshots (chat_id, messages_json, seq, timestamp) '
+                'VALUES (?, ?, ?, ?)',
+                (chat_id, to_blob(messages_json), seq, _now()),
+            )
+            if delete_log_upto is None:
+                self._conn.execute('DELETE FROM history_log WHERE chat_id = ?', (chat_id,))
+            else:
+                self._conn.execute(
+                    'DELETE FROM history_log WHERE chat_id = ? AND seq <= ?', (chat_id, delete_log_upto),
+                )
+
+    async def compact_history(
+        self, chat_id: int, messages_json: str, seq: int, delete_log_upto: int | None
+    ) -> None:
+        await self._run(self._compact_history, chat_id, messages_json, seq, delete_log_upto)
+
+    async def append_history_log(self, chat_id: int, seq: int, messages_json: str) -> None:
+        await self._run(
+            self._execute,
+            'INSERT OR REPLACE INTO history_log (chat_id, seq, messages_json, timestamp) VALUES (?, ?, ?, ?)',
+            (chat_id, seq, to_blob(messages_json), _now()),
+        )
+
+    async def iter_history_snapshots(self, page_size: int = STATE_PAGE_SIZE) -> AsyncIterator[list[dict]]:
+        async for rows in self._iter_pages(
+            'SELECT chat_id, messages_json, seq FROM history_snapshots', 'chat_id', page_size,
+        ):
+            yield _decoded(rows)
+
+    async def load_history_logs(self, chat_ids: list[int]) -> list[dict]:
+        if not chat_ids:
+            return []
+        marks = ', '.join('?' * len(chat_ids))
+        rows = await self._run(
+            self._fetchall,
+            f'SELECT chat_id, seq, messages_json FROM history_log WHERE chat_id IN ({marks})',
+            tuple(chat_ids),
+        )
+        return _decoded(rows)
+
+    async def load_history(self, chat_id: int) -> tuple[dict | None, list[dict]]:
+        rows = await self._run(
+            self._fetchall,
+            'SELECT chat_id, messages_json, seq FROM history_snapshots WHERE chat_id = ?',
+            (chat_id,),
+        )
+        if not rows:
+            return None, []
+        return _decoded(rows)[0], await self.load_history_logs([chat_id])
+
+    async def flush_history(self) -> None:
+        pass  # writes are committed synchronously
+
+    # ── alarms ──
+
+    async def save_alarm(
+        self, alarm_id: str, chat_id: int, message: str, fire_at: str, repeat: str | None = None
+    ) -> None:
+        await self._run(
+            self._execute,
+            'INSERT OR REPLACE INTO alarms (alarm_id, chat_id, message, fire_at, repeat, active) '
+            'VALUES (?, ?, ?, ?, ?, 1)',
+            (alarm_id, chat_id, message, fire_at, repeat),
+        )
+
+    async def deactivate_alarm(self, alarm_id: str) -> None:
+        await self._run(self._execute, 'UPDATE alarms SET active = 0 WHERE alarm_id = ?', (alarm_id,))
+
+    async def iter_active_alarms(self, page_size: int = STATE_PAGE_SIZE) -> AsyncIterator[list[dict]]:
+        async for rows in self._iter_pages(
+            'SELECT alarm_id, chat_id, message, fire_at, repeat, active FROM alarms',
+            'alarm_id', page_size, where='active = 1',
+        ):
+            yield [{**r, 'active': bool(r['active'])} for r in rows]
+
+    # ── briefings ──
+
+    async def save_briefing(self, chat_id: int, time: str) -> None:
+        await self._run(
+            self._execute,
+            'INSERT OR REPLACE INTO briefings (chat_id, time, active) VALUES (?, ?, 1)',
+            (chat_id, time),
+        )
+
+    async def load_briefing(self, chat_id: int) -> dict | None:
+        rows = await self._run(
+            self._fetchall, 'SELECT chat_id, time, active FROM briefings WHERE chat_id = ?', (chat_id,),
+        )
+        return {**rows[0], 'active': bool(rows[0]['active'])} if rows else None
+
+    async def deactivate_briefing(self, chat_id: int) -> None:
+        await self._run(self._execute, 'UPDATE briefings SET active = 0 WHERE chat_id = ?', (chat_id,))
+
+    async def iter_active_briefings(self, page_size: int = STATE_PAGE_SIZE) -> AsyncIterator[list[dict]]:
+        async for rows in self._iter_pages(
+            'SELECT chat_id, time, active FROM briefings', 'chat_id', page_size, where='active = 1',
+        ):
+            yield [{**r, 'active': bool(r['active'])} for r in rows]
+
+    # ── legacy import (one transaction, never overwrites existing rows) ──
+
+    def _import_begin(self) -> None:
+        self._conn.execute('BEGIN')
+
+    def _import_history(self, snap: dict, logs: list[dict]) -> bool:
+        cur = self._conn.execute(
+            'INSERT OR IGNORE INTO history_snapshots (chat_id, messages_json, seq, timestamp) VALUES (?, ?, ?, ?)',
+            (snap['chat_id'], to_blob(snap['messages_json']), snap['seq'], _now()),
+        )
+        if not cur.rowcount:
+            return False  # the chat already has newer history here
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO history_log (chat_id, seq, messages_json, timestamp) VALUES (?, ?, ?, ?)',
+            [(e['chat_id'], e['seq'], to_blob(e['messages_json']), _now()) for e in logs],
+        )
+        return True
+
+    def _import_alarm(self, a: dict) -> bool:
+        return bool(self._conn.execute(
+            'INSERT OR IGNORE INTO alarms (alarm_id, chat_id, message, fire_at, repeat, active) '
+            'VALUES (?, ?, ?, ?, ?, 1)',
+            (a['alarm_id'], a['chat_id'], a['message'], a['fire_at'], a.get('repeat')),
+        ).rowcount)
+
+    def _import_briefing(self, b: dict) -> bool:
+        return bool(self._conn.execute(
+            'INSERT OR IGNORE INTO briefings (chat_id, time, active) VALUES (?, ?, 1)', (b['chat_id'], b['time']),
+        ).rowcount)
+
+    def _import_commit(self) -> None:
+        self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (IMPORT_DONE_KEY, _now()))
+        self._conn.commit()
+
+    def _import_rollback(self) -> None:
+        self._conn.rollback()
+
+
+async def import_from_qdrant(store: SqliteStateStore) -> None:
+    """Copy the legacy Qdrant state collections into the SQLite store.
+
+    All-or-nothing: the rows and the completion mark commit together, so a
+    failed or skipped import simply runs again on the next start.  Rows the
+    store already has (written since a failed attempt) are left alone.
+    """
+    client = qs.get_client()
+    try:
+        existing = {c.name for c in (await client.get_collections()).collections}
+    except Exception:
+        logger.warning('Qdrant unreachable — state import will be retried on next start', exc_info=True)
+        return
+
+    counts = {'histories': 0, 'alarms': 0, 'briefings': 0, 'skipped': 0}
+    await store._run(store._import_begin)
+    try:
+        if qs.HISTORY_SNAPSHOTS in existing:
+            async for page in qs.iter_history_snapshots(STATE_PAGE_SIZE):
+                logs = await qs.load_history_logs([s['chat_id'] for s in page]) if qs.HISTORY_LOG in existing else []
+                for snap in page:
+                    chat_logs = [e for e in logs if e['chat_id'] == snap['chat_id']]
+                    imported = await store._run(store._import_history, snap, chat_logs)
+                    counts['histories' if imported else 'skipped'] += 1
+        if qs.ALARMS in existing:
+            async for page in qs.iter_active_alarms(STATE_PAGE_SIZE):
+                for a in page:
+                    counts['alarms' if await store._run(store._import_alarm, a) else 'skipped'] += 1
+        if qs.BRIEFINGS in existing:
+            async for page in qs.iter_active_briefings(STATE_PAGE_SIZE):
+                for b in page:
+                    counts['briefings' if await store._run(store._import_briefing, b) else 'skipped'] += 1
+        await store._run(store._import_commit)
+    except Exception:
+        await store._run(store._import_rollback)
+        logger.error('State import from Qdrant failed — will be retried on next start', exc_info=True)
+        return
+    logger.info('Imported legacy state from Qdrant: %s', counts)
+
+
+_store: StateStore | None = None
+
+
+def get_store() -> StateStore:
+    global _store
+    if _store is None:
+        _store = SqliteStateStore(STATE_DB_PATH) if STATE_STORE == 'sqlite' else QdrantStateStore()
+    return _store
@@ -0,0 +1,231 @@
+"""Rolling conversation summary — folds old turns into one system message.
+
+After a reply is sent, a chat whose history has grown past SUMMARY_TRIGGER_TOKENS
+gets a background summarization: everything before the most recent
+SUMMARY_KEEP_TOKENS of whole turns is summarized by vLLM (together with the
+previous summary, if any) and replaced by a single request carrying the
+system prompt + the summary.  Later turns then prefill summary + recent tail
+instead of the full history.
+
+At most one summarization runs per chat, and SUMMARY_CONCURRENCY caps how
+many share the vLLM instance with live requests.  The summary is grafted
+under the chat's queue lock, after any turn already running for it, so the
+reply path can't overwrite it.  If the chat's history no longer contains the
+tail the summary was built against (reset, or already rewritten), the result
+is discarded.
+"""
+
+import asyncio
+import logging
+import os
+from collections.abc import MutableMapping
+
+import httpx
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from chat_queue import get_chat_queue
+from format import strip_think
+from history import HISTORY_TOKEN_BUDGET, count_message_tokens
+
+logger = logging.getLogger(__name__)
+
+VLLM_BASE_URL = os.getenv('VLLM_BASE_URL', 'http://vllm:8000/v1')
+VLLM_MODEL = os.getenv('VLLM_MODEL', 'Qwen/Qwen3-32B')
+
+SUMMARY_TRIGGER_TOKENS = int(os.getenv('SUMMARY_TRIGGER_TOKENS', str(HISTORY_TOKEN_BUDGET * 3 // 4)))
+SUMMARY_KEEP_TOKENS = int(os.getenv('SUMMARY_KEEP_TOKENS', '4000'))
+SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS', '768'))
+SUMMARY_CONCURRENCY = int(os.getenv('SUMMARY_CONCURRENCY', '1'))
+
+# Marks the summary part so the next pass can find and extend it
+SUMMARY_REF = 'conversation_summary'
+
+# Tool outputs are clipped in the transcript handed to the summarizer
+TOOL_RESULT_CHARS = 500
+
+SUMMARY_PROMPT = """\
+다음은 사용자(제리)와 AI 비서(자비스)의 이전 대화다. 이후 대화를 이어가는 데 필요한 내용만 남겨 간결하게 요약해라.
+- 제리가 요청한 일, 결정된 사항, 약속/일정, 아직 끝나지 않은 일을 빠짐없이 남겨라.
+- 이름, 고유명사, 숫자, 날짜는 원문 그대로 옮겨라.
+- 도구 결과는 결론만 남겨라.
+- 인사말이나 잡담은 생략해라.
+{previous}
+대화:
+{transcript}
+
+요약만 한국어 글머리표로 출력해라.
+/no_think"""
+
+
+def _summary_part(message: ModelMessage) -> SystemPromptPart | None:
+    if isinstance(message, ModelRequest):
+        for part in message.parts:
+            if isinstance(part, SystemPromptPart) and part.dynamic_ref == SUMMARY_REF:
+                return part
+    return None
+
+
+def _transcript(messages: list[ModelMessage]) -> str:
+    lines = []
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, UserPromptPart) and isinstance(part.content, str):
+                lines.append(f'제리: {part.content}')
+            elif isinstance(part, TextPart):
+                text = strip_think(part.content)
+                if text:
+                    lines.append(f'자비스: {text}')
+            elif isinstance(part, ToolCallPart):
+                lines.append(f'[도구 호출] {part.tool_name}({part.args_as_json_str()})')
+            elif isinstance(part, ToolReturnPart):
+                lines.append(f'[도구 결과] {part.tool_name}: {part.model_response_str()[:TOOL_RESULT_CHARS]}')
+    return '\n'.join(lines)
+
+
+def _split_point(messages: list[ModelMessage]) -> int | None:
+    """Index of the oldest turn start whose tail fits in SUMMARY_KEEP_TOKENS (never 0)."""
+    used = 0
+    cut = None
+    for i in range(len(messages) - 1, 0, -1):
+        used += count_message_tokens(messages[i])
+        if used > SUMMARY_KEEP_TOKENS and cut is not None:
+            break
+        message = messages[i]
+        if isinstance(message, ModelRequest) and any(isinstance(p, UserPromptPart) for p in message.parts):
+            cut = i
+    return cut
+
+
+class Summarizer:
+    def __init__(self, concurrency: int) -> None:
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: dict[int, asyncio.Task] = {}
+        # Metrics
+        self.summaries = 0
+        self.discarded = 0
+        self.failed = 0
+        self.tokens_summarized = 0  # head tokens replaced
+        self.tokens_written = 0  # summary tokens that replaced them
+        self.last_saved: dict[int, int] = {}  # chat_id -> prefill tokens saved per turn
+
+    def maybe_schedule(self, chat_id: int, histories: MutableMapping[int, list[ModelMessage]]) -> bool:
+        """Start a background summarization if the chat's history is over the trigger."""
+        if chat_id in self._tasks:
+            return False
+        messages = histories.get(chat_id) or []
+        if sum(count_message_tokens(m) for m in messages) <= SUMMARY_TRIGGER_TOKENS:
+            return False
+        task = asyncio.create_task(self._summarize(chat_id, histories), name=f'summarize-{chat_id}')
+        self._tasks[chat_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(chat_id, None))
+        return True
+
+    async def _summarize(self, chat_id: int, histories: MutableMapping[int, list[ModelMessage]]) -> None:
+        try:
+            snapshot = list(histories.get(chat_id) or [])
+            cut = _split_point(snapshot)
+            if cut is None:
+                return
+            head, anchor = snapshot[:cut], snapshot[cut]
+            previous = _summary_part(head[0])
+            if previous is not None and len(head) == 1:
+                return  # nothing new to fold in yet
+            prompt = SUMMARY_PROMPT.format(
+                previous=f'\n기존 요약:\n{previous.content}\n' if previous else '',
+                transcript=_transcript(head),
+            )
+            async with self._semaphore:
+                summary = await _complete(prompt)
+            if not summary:
+                return
+
+            system_parts = [
+                p for p in head[0].parts
+                if isinstance(p, SystemPromptPart) and p.dynamic_ref != SUMMARY_REF
+            ] if isinstance(head[0], ModelRequest) else []
+            summary_message = ModelRequest(parts=[
+                *system_parts,
+                SystemPromptPart(f'이전 대화 요약:\n{summary}', dynamic_ref=SUMMARY_REF),
+            ])
+
+            # Wait out a running turn, or its reply would overwrite the graft
+            async with get_chat_queue().chat(chat_id):
+                # The reply path may have replaced the history meanwhile; graft onto the current one
+                current = histories.get(chat_id) or []
+                start = next((i for i, m in enumerate(current) if m is anchor), None)
+                if start is None:
+                    self.discarded += 1
+                    logger.info('Summary for chat %d discarded — history changed', chat_id)
+                    return
+                histories[chat_id] = [summary_message, *current[start:]]
+
+                from memory.manager import mark_history_rewritten
+
+                mark_history_rewritten(chat_id)
+
+            before = sum(count_message_tokens(m) for m in head)
+            after = count_message_tokens(summary_message)
+            self.summaries += 1
+            self.tokens_summarized += before
+            self.tokens_written += after
+            self.last_saved[chat_id] = before - after
+            logger.info(
+                'Summarized chat %d: %d messages / %d tokens -> %d tokens (saves %d prefill tokens per turn)',
+                chat_id, len(head), before, after, before - after,
+            )
+        except Exception:
+            self.failed += 1
+            logger.error('Summarization failed for chat %d', chat_id, exc_info=True)
+
+    async def stop(self) -> None:
+        """Cancel summaries still in flight (their results would be lost anyway)."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        saved = list(self.last_saved.values())
+        return {
+            'in_flight': len(self._tasks),
+            'summaries': self.summaries,
+            'discarded': self.discarded,
+            'failed': self.failed,
+            'tokens_summarized': self.tokens_summarized,
+            'tokens_written': self.tokens_written,
+            'saved_per_turn_avg': sum(saved) / len(saved) if saved else 0.0,
+            'saved_per_turn_total': sum(saved),
+        }
+
+
+async def _complete(prompt: str) -> str:
+    async with httpx.AsyncClient(timeout=120) as client:
+        resp = await client.post(
+            f'{VLLM_BASE_URL}/chat/completions',
+            json={
+                'model': VLLM_MODEL,
+                'messages': [{'role': 'user', 'content': prompt}],
+                'temperature': 0.1,
+                'max_tokens': SUMMARY_MAX_TOKENS,
+            },
+        )
+        resp.raise_for_status()
+        return strip_think(resp.json()['choices'][0]['message']['content'] or '')
+
+
+_summarizer: Summarizer | None = None
+
+
+def get_summarizer() -> Summarizer:
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = Summarizer(SUMMARY_CONCURRENCY)
+    return _summarizer
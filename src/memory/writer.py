@@ -0,0 +1,170 @@
+"""Bounded background worker pool for post-turn memory writes.
+
+handle_message hands each finished turn to the writer instead of spawning an
+untracked task.  Turns wait in a bounded queue and a fixed number of workers
+run the embedding + Qdrant + insight extraction work, so bursts can't starve
+live requests.  A chat that already has a job waiting in the queue gets its
+new turn coalesced into that job (one embed batch, one snapshot write).
+
+Overflow policy when the queue is full: 'drop' the new turn (counted) or
+'block' the caller until a slot frees up.  stop() drains the queue on shutdown.
+"""
+
+import asyncio
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from pydantic_ai.messages import ModelMessage
+
+logger = logging.getLogger(__name__)
+
+MEMORY_WRITE_QUEUE_SIZE = int(os.getenv('MEMORY_WRITE_QUEUE_SIZE', '64'))
+MEMORY_WRITE_WORKERS = int(os.getenv('MEMORY_WRITE_WORKERS', '2'))
+MEMORY_WRITE_OVERFLOW = os.getenv('MEMORY_WRITE_OVERFLOW', 'drop')  # drop | block
+MEMORY_WRITE_DRAIN_TIMEOUT = float(os.getenv('MEMORY_WRITE_DRAIN_TIMEOUT', '30'))
+
+TurnHandler = Callable[[int, list[tuple[str, str]], list[ModelMessage]], Awaitable[None]]
+
+
+@dataclass
+class TurnJob:
+    chat_id: int
+    turns: list[tuple[str, str]]
+    messages: list[ModelMessage]
+
+
+class MemoryWriter:
+    def __init__(self, handler: TurnHandler, maxsize: int, workers: int, overflow: str) -> None:
+        self._handler = handler
+        self._maxsize = maxsize
+        self._num_workers = workers
+        self._overflow = overflow
+        self._queue: asyncio.Queue[TurnJob] | None = None
+        self._workers: list[asyncio.Task] = []
+        # Jobs still waiting in the queue, by chat — targets for coalescing
+        self._pending: dict[int, TurnJob] = {}
+        # Keeps two workers from writing the same chat out of order
+        self._chat_locks: dict[int, asyncio.Lock] = {}
+        self._closed = False
+        # Metrics
+        self.enqueued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(self._maxsize)
+        self._workers = [
+            asyncio.create_task(self._work(), name=f'memory-writer-{i}')
+            for i in range(self._num_workers)
+        ]
+        logger.info(
+            'Memory writer started (workers=%d, queue=%d, overflow=%s)',
+            self._num_workers, self._maxsize, self._overflow,
+        )
+
+    async def submit(
+        self, chat_id: int, user_text: str, assistant_text: str, messages: list[ModelMessage]
+    ) -> bool:
+        """Queue a finished turn. Returns False if it was dropped."""
+        if self._queue is None or self._closed:
+            self.dropped += 1
+            return False
+
+        job = self._pending.get(chat_id)
+        if job is not None:
+            job.turns.append((user_text, assistant_text))
+            job.messages = messages
+            self.coalesced += 1
+            return True
+
+        if self._queue.full() and self._overflow != 'block':
+            self.dropped += 1
+            logger.warning('Memory write queue full — dropped turn for chat %d', chat_id)
+            return False
+
+        job = TurnJob(chat_id, [(user_text, assistant_text)], messages)
+        self._pending[chat_id] = job
+        await self._queue.put(job)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if self._pending.get(job.chat_id) is job:
+                del self._pending[job.chat_id]
+            lock = self._chat_locks.setdefault(job.chat_id, asyncio.Lock())
+            try:
+                async with lock:
+                    await self._handler(job.chat_id, job.turns, job.messages)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                logger.error('Memory write failed for chat %d', job.chat_id, exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def busy(self, chat_id: int) -> bool:
+        """Whether a write for this chat is queued or running."""
+        lock = self._chat_locks.get(chat_id)
+        return chat_id in self._pending or (lock is not None and lock.locked())
+
+    async def persist_history(self, chat_id: int, messages: list[ModelMessage]) -> None:
+        """Save a chat's history in order with its queued turn writes (history cache spill).
+
+        Returns only once the history is durable — the cache drops its copy after this.
+        """
+        from memory.manager import save_history
+        from memory.state_store import get_store
+
+        async with self._chat_locks.setdefault(chat_id, asyncio.Lock()):
+            await save_history(chat_id, messages)
+            await get_store().flush_history()
+
+    async def stop(self, timeout: float) -> None:
+        """Stop accepting turns, drain what is queued, then stop the workers."""
+        if self._queue is None:
+            return
+        self._closed = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning('Memory writer drain timed out — %d job(s) lost', self._queue.qsize())
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        logger.info('Memory writer stopped: %s', self.stats())
+
+    def stats(self) -> dict:
+        return {
+            'depth': self._queue.qsize() if self._queue is not None else 0,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'processed': self.processed,
+            'failed': self.failed,
+        }
+
+
+_writer: MemoryWriter | None = None
+
+
+def get_writer() -> MemoryWriter:
+    global _writer
+    if _writer is None:
+        from memory.manager import on_turn_complete
+
+        _writer = MemoryWriter(
+            on_turn_complete,
+            MEMORY_WRITE_QUEUE_SIZE,
+            MEMORY_WRITE_WORKERS,
+            MEMORY_WRITE_OVERFLOW,
+        )
+    return _writer
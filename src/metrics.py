@@ -0,0 +1,185 @@
+"""Prometheus latency metrics and the /metrics endpoint.
+
+Four histogram families, labelled by name:
+
+- ``jarvis_stage_seconds{stage}``: handle_message stages (queue waits, history
+  load, retrieval, agent run, send) and the components under them
+  (get_relevant_context, embed_texts, Playwright fetches)
+- ``jarvis_tool_seconds{tool}``: every agent tool call
+- ``jarvis_qdrant_seconds{op}``: each qdrant_store call
+- ``jarvis_gog_seconds{service}``: gog subprocesses
+
+Failures (an exception escaping the timed block, or ``failed`` set) count in
+``jarvis_errors_total{kind,name}``.  Histograms only give quantiles through
+PromQL, so the last METRICS_WINDOW samples of each series are also exported
+as ``jarvis_latency_quantile_seconds{kind,name,quantile}`` (p50/p95/p99), and
+the stats() dicts of the other components as ``jarvis_<component>_<key>``
+gauges.  Those are read on the event loop by a JobQueue job every
+METRICS_STATS_INTERVAL_S seconds (the scrape runs on the HTTP server's thread,
+where iterating loop-owned dicts could race) and served from that snapshot.
+
+The endpoint listens on METRICS_ADDR:METRICS_PORT (METRICS_PORT=0 disables it).
+"""
+
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+
+from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))
+# All interfaces, so the compose port mapping reaches it (compose publishes it on host loopback only)
+METRICS_ADDR = os.getenv('METRICS_ADDR', '0.0.0.0')
+METRICS_WINDOW = int(os.getenv('METRICS_WINDOW', '1024'))
+METRICS_STATS_INTERVAL_S = float(os.getenv('METRICS_STATS_INTERVAL_S', '15'))
+
+# 5 ms … 2 min: covers a cached Qdrant lookup as well as a tool-heavy agent run
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_HISTOGRAMS = {
+    'stage': Histogram('jarvis_stage_seconds', 'Latency of request stages', ['stage'], buckets=BUCKETS),
+    'tool': Histogram('jarvis_tool_seconds', 'Latency of agent tool calls', ['tool'], buckets=BUCKETS),
+    'qdrant': Histogram('jarvis_qdrant_seconds', 'Latency of qdrant_store calls', ['op'], buckets=BUCKETS),
+    'gog': Histogram('jarvis_gog_seconds', 'Latency of gog subprocesses', ['service'], buckets=BUCKETS),
+}
+ERRORS = Counter('jarvis_errors_total', 'Timed calls that failed', ['kind', 'name'])
+
+# Recent samples per (kind, name), for the exported quantiles
+_windows: dict[tuple[str, str], deque[float]] = {}
+_windows_lock = threading.Lock()  # embed/tokenizer threads observe too
+
+# component -> stats() callable, exported as gauges
+_stats_sources: dict[str, Callable[[], dict]] = {}
+# Last values read on the event loop: component -> {key: number}; replaced whole
+_stats_snapshot: dict[str, dict[str, float]] = {}
+
+
+def observe(kind: str, name: str, seconds: float, failed: bool = False) -> None:
+    _HISTOGRAMS[kind].labels(name).observe(seconds)
+    if failed:
+        ERRORS.labels(kind, name).inc()
+    with _windows_lock:
+        window = _windows.get((kind, name))
+        if window is None:
+            window = _windows[(kind, name)] = deque(maxlen=METRICS_WINDOW)
+        window.append(seconds)
+
+
+class timed:
+    """Time a block (``with timed('stage', 'retrieval'):``) or every call of a function (as a decorator).
+
+    An exception escaping the block counts as a failure; so does setting
+    ``failed = True`` on the context manager for errors that don't raise.
+    """
+
+    def __init__(self, kind: str, name: str) -> None:
+        self.kind = kind
+        self.name = name
+        self.failed = False
+        self._start = 0.0
+
+    def __enter__(self) -> 'timed':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        observe(self.kind, self.name, time.perf_counter() - self._start, failed=self.failed or exc_type is not None)
+        return False
+
+    def __call__(self, fn: Callable) -> Callable:
+        kind, name = self.kind, self.name
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(kind, name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(kind, name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def timed_tool(fn: Callable) -> Callable:
+    """Time an agent tool under its function name; goes below @agent.tool / @agent.tool_plain."""
+    return timed('tool', fn.__name__)(fn)
+
+
+def register_stats(component: str, source: Callable[[], dict]) -> None:
+    """Export the numeric top-level values of ``source()`` as jarvis_<component>_<key> gauges."""
+    _stats_sources[component] = source
+
+
+def refresh_stats() -> None:
+    """Read every registered stats() source. Call on the event loop."""
+    global _stats_snapshot
+    snapshot = {}
+    for component, source in _stats_sources.items():
+        try:
+            stats = source()
+        except Exception:
+            logger.warning('Stats source %s failed', component, exc_info=True)
+            continue
+        snapshot[component] = {
+            key: value for key, value in stats.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+    _stats_snapshot = snapshot
+
+
+async def _refresh_callback(context) -> None:
+    refresh_stats()
+
+
+def schedule_stats_refresh(job_queue) -> None:
+    """Refresh the stats gauges every METRICS_STATS_INTERVAL_S (first run right away)."""
+    job_queue.run_repeating(_refresh_callback, interval=METRICS_STATS_INTERVAL_S, first=0, name='metrics_stats')
+
+
+def _quantile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _WindowCollector:
+    def collect(self):
+        family = GaugeMetricFamily(
+            'jarvis_latency_quantile_seconds',
+            f'Latency quantiles over the last {METRICS_WINDOW} samples',
+            labels=['kind', 'name', 'quantile'],
+        )
+        with _windows_lock:
+            snapshot = {key: sorted(window) for key, window in _windows.items() if window}
+        for (kind, name), ordered in snapshot.items():
+            for q in QUANTILES:
+                family.add_metric([kind, name, str(q)], _quantile(ordered, q))
+        yield family
+
+        for component, stats in _stats_snapshot.items():
+            for key, value in stats.items():
+                yield GaugeMetricFamily(f'jarvis_{component}_{key}', f'{component} stats: {key}', value=value)
+
+
+REGISTRY.register(_WindowCollector())
+
+_server_started = False
+
+
+def start_metrics_server() -> None:
+    """Serve /metrics on METRICS_ADDR:METRICS_PORT (once; METRICS_PORT=0 disables)."""
+    global _server_started
+    if _server_started or not METRICS_PORT:
+        return
+    start_http_server(METRICS_PORT, addr=METRICS_ADDR)
+    _server_started = True
+    logger.info('Metrics on http://%s:%d/metrics', METRICS_ADDR, METRICS_PORT)
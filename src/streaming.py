@@ -0,0 +1,133 @@
+"""Streamed replies: the full agent graph via agent.iter(), shown as it is generated.
+
+run_stream() ends the run at the first text output, skipping tool calls the
+model emits alongside it.  agent.iter() walks the same graph as agent.run() —
+every tool call still executes — and each model request node can be streamed.
+Text of the response being generated is shown in a placeholder message, edited
+at most every REPLY_EDIT_INTERVAL_S seconds (Telegram rate-limits edits).
+
+The preview is plain text with <think> blocks filtered out incrementally; a
+response that turns out to call tools is intermediate, so its text is dropped
+and the placeholder restored.  The final answer replaces the preview as HTML.
+"""
+
+import logging
+import os
+import time
+
+from pydantic_ai import Agent
+from pydantic_ai.agent import AgentRunResult
+from pydantic_ai.messages import (
+    ModelMessage,
+    PartDeltaEvent,
+    PartStartEvent,
+    TextPart,
+    TextPartDelta,
+    ToolCallPart,
+)
+from telegram import Message
+from telegram.constants import ParseMode
+from telegram.error import BadRequest
+
+from agent import ChatDeps, agent
+from format import ThinkFilter
+
+logger = logging.getLogger(__name__)
+
+REPLY_MODE = os.getenv('REPLY_MODE', 'final')  # final | stream
+REPLY_EDIT_INTERVAL_S = float(os.getenv('REPLY_EDIT_INTERVAL_S', '1.0'))
+
+PLACEHOLDER = '…'
+TG_MAX_CHARS = 4096
+
+
+class StreamingReply:
+    """A placeholder message edited in place as the answer streams in."""
+
+    def __init__(self, message: Message) -> None:
+        self._message = message
+        self._reply: Message | None = None
+        self._shown = ''
+        self._last_edit = 0.0
+        self.edits = 0
+
+    async def start(self) -> None:
+        self._reply = await self._message.reply_text(PLACEHOLDER)
+        self._shown = PLACEHOLDER
+
+    async def _edit(self, text: str, **kwargs) -> None:
+        if self._reply is None or text == self._shown:
+            return
+        try:
+            await self._reply.edit_text(text, **kwargs)
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                raise
+        self._shown = text
+        self._last_edit = time.monotonic()
+        self.edits += 1
+
+    async def preview(self, text: str) -> None:
+        """Show partial text, throttled to one edit per REPLY_EDIT_INTERVAL_S."""
+        text = text.strip()
+        if not text or time.monotonic() - self._last_edit < REPLY_EDIT_INTERVAL_S:
+            return
+        try:
+            await self._edit(text[:TG_MAX_CHARS - 2] + ' ' + PLACEHOLDER)
+        except Exception:
+            logger.warning('Preview edit failed', exc_info=True)
+
+    async def reset(self) -> None:
+        try:
+            await self._edit(PLACEHOLDER)
+        except Exception:
+            logger.warning('Preview reset failed', exc_info=True)
+
+    async def finish(self, formatted: str, plain: str) -> None:
+        """Replace the preview with the final answer (HTML, falling back to plain text)."""
+        if self._reply is None:  # placeholder never got posted
+            await self._message.reply_text(plain)
+            return
+        try:
+            await self._edit(formatted, parse_mode=ParseMode.HTML)
+        except Exception:
+            logger.warning('HTML edit failed, falling back to plain text')
+            try:
+                await self._edit(plain)
+            except Exception:
+                logger.warning('Plain edit failed, sending a new message')
+                await self._message.reply_text(plain)
+
+
+async def run_streamed(
+    user_msg: str, history: list[ModelMessage], deps: ChatDeps, reply: StreamingReply,
+) -> AgentRunResult:
+    """agent.run() equivalent that previews each model response in ``reply``."""
+    async with agent.iter(user_msg, message_history=history, deps=deps) as run:
+        async for node in run:
+            if not Agent.is_model_request_node(node):
+                continue
+            think = ThinkFilter()
+            visible = ''
+            calls_tools = False
+            async with node.stream(run.ctx) as stream:
+                async for event in stream:
+                    if isinstance(event, PartStartEvent):
+                        if isinstance(event.part, ToolCallPart):
+                            if not calls_tools:
+                                calls_tools = True
+                                await reply.reset()
+                            continue
+                        if isinstance(event.part, TextPart):
+                            visible += think.feed(event.part.content)
+                    elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                        visible += think.feed(event.delta.content_delta)
+                    else:
+                        continue
+                    if not calls_tools:
+                        await reply.preview(visible)
+            # A held-back partial tag ('<thi') that turned out to be plain text
+            tail = think.flush()
+            if tail and not calls_tools:
+                await reply.preview(visible + tail)
+    return run.result
@@ -4,6 +4,8 @@ import asyncio
 import logging
 import os
 
+from metrics import timed
+
 GOG_PATH = os.getenv('GOG_PATH', '/app/gog')
 GOG_ACCOUNT = os.getenv('GOG_ACCOUNT', '')
 GOG_TIMEZONE = os.getenv('GOG_TIMEZONE', '+09:00')  # KST
@@ -22,12 +24,15 @@ def _ensure_tz(dt_str: str) -> str:
 
 async def _run_gog(args: list[str]) -> tuple[str, str, int]:
     """Run gog binary and return (stdout, stderr, returncode)."""
-    proc = await asyncio.create_subprocess_exec(
-        *args,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await proc.communicate()
+    service = next((a for a in args[1:] if not a.startswith('-')), 'gog')
+    with timed('gog', service) as t:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await proc.communicate()
+        t.failed = proc.returncode != 0
     return stdout.decode(), stderr.decode(), proc.returncode
 
 
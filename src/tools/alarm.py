@@ -6,6 +6,7 @@ from datetime import datetime, timezone
 from pydantic_ai import RunContext
 
 from agent import agent
+from metrics import timed_tool
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,7 @@ def set_job_queue(jq) -> None:
 
 
 @agent.tool
+@timed_tool
 async def set_alarm(
     ctx: RunContext,
     message: str,
@@ -49,7 +51,7 @@ async def set_alarm(
         return f'시간 형식이 올바르지 않습니다: {fire_at}. ISO 8601 형식을 사용해주세요.'
 
     # Get chat_id from context deps (set by bot.py)
-    chat_id = ctx.deps
+    chat_id = ctx.deps.chat_id
     if not isinstance(chat_id, int):
         return '채팅 ID를 확인할 수 없습니다.'
 
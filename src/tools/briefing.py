@@ -6,6 +6,7 @@ import re
 from pydantic_ai import RunContext
 
 from agent import agent
+from metrics import timed_tool
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,7 @@ def set_job_queue(jq) -> None:
 
 
 @agent.tool
+@timed_tool
 async def set_briefing(
     ctx: RunContext,
     time: str,
@@ -33,7 +35,7 @@ async def set_briefing(
     if _job_queue is None:
         return '브리핑 시스템이 초기화되지 않았습니다.'
 
-    chat_id = ctx.deps
+    chat_id = ctx.deps.chat_id
     if not isinstance(chat_id, int):
         return '채팅 ID를 확인할 수 없습니다.'
 
@@ -50,6 +52,7 @@ async def set_briefing(
 
 
 @agent.tool
+@timed_tool
 async def stop_briefing(ctx: RunContext) -> str:
     """일일 브리핑을 중지합니다. "브리핑 그만", "브리핑 중지" 등에 사용하세요."""
     from memory.briefing import stop_briefing_schedule
@@ -57,7 +60,7 @@ async def stop_briefing(ctx: RunContext) -> str:
     if _job_queue is None:
         return '브리핑 시스템이 초기화되지 않았습니다.'
 
-    chat_id = ctx.deps
+    chat_id = ctx.deps.chat_id
     if not isinstance(chat_id, int):
         return '채팅 ID를 확인할 수 없습니다.'
 
@@ -7,6 +7,7 @@ from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
 
 from agent import agent
+from metrics import timed_tool
 
 logger = logging.getLogger(__name__)
 
@@ -113,6 +114,7 @@ def _calc(expression: str) -> str:
 
 
 @agent.tool_plain
+@timed_tool
 def date_calc(expression: str) -> str:
     """날짜를 계산합니다. 날짜 관련 질문에는 반드시 이 도구를 사용하세요.
 
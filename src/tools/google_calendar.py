@@ -4,6 +4,7 @@ import re
 from datetime import date, timedelta
 
 from agent import agent
+from metrics import timed_tool
 from tools._gog import (
     GOG_TIMEZONE,
     _auto_end_time,
@@ -15,6 +16,7 @@ from tools._gog import (
 
 
 @agent.tool_plain
+@timed_tool
 async def calendar(
     action: str,
     from_date: str = '',
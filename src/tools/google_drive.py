@@ -1,10 +1,12 @@
 """Google Drive tool."""
 
 from agent import agent
+from metrics import timed_tool
 from tools._gog import _base_args, _run_and_format
 
 
 @agent.tool_plain
+@timed_tool
 async def drive(
     action: str,
     query: str = '',
@@ -5,11 +5,13 @@ import logging
 from pydantic_ai import RunContext
 
 from agent import agent
+from metrics import timed_tool
 
 logger = logging.getLogger(__name__)
 
 
 @agent.tool
+@timed_tool
 async def save_memo(
     ctx: RunContext,
     content: str,
@@ -24,7 +26,7 @@ async def save_memo(
     from memory import qdrant_store as qs
     from memory.embeddings import embed_text
 
-    chat_id = ctx.deps
+    chat_id = ctx.deps.chat_id
     if not isinstance(chat_id, int):
         return '채팅 ID를 확인할 수 없습니다.'
 
@@ -32,12 +34,13 @@ async def save_memo(
         category = 'memo'
 
     vector = await embed_text(content)
-    memo_id = qs.save_memo(vector, chat_id, content, category)
+    memo_id = await qs.save_memo(vector, chat_id, content, category)
     logger.info('Saved memo %s for chat %d: %s', memo_id, chat_id, content[:50])
     return f'메모 저장 완료: "{content}"'
 
 
 @agent.tool
+@timed_tool
 async def search_memo(
     ctx: RunContext,
     query: str,
@@ -50,12 +53,12 @@ async def search_memo(
     from memory import qdrant_store as qs
     from memory.embeddings import embed_text
 
-    chat_id = ctx.deps
+    chat_id = ctx.deps.chat_id
     if not isinstance(chat_id, int):
         return '채팅 ID를 확인할 수 없습니다.'
 
     vector = await embed_text(query)
-    results = qs.search_memos(vector, chat_id, limit=5)
+    results = await qs.search_memos(vector, chat_id, limit=5)
 
     if not results:
         return '관련 메모가 없습니다.'
@@ -70,15 +73,16 @@ async def search_memo(
 
 
 @agent.tool
+@timed_tool
 async def list_memos(ctx: RunContext) -> str:
     """저장된 모든 메모 목록을 보여줍니다. "내 메모 보여줘", "메모 목록" 등에 사용하세요."""
     from memory import qdrant_store as qs
 
-    chat_id = ctx.deps
+    chat_id = ctx.deps.chat_id
     if not isinstance(chat_id, int):
         return '채팅 ID를 확인할 수 없습니다.'
 
-    memos = qs.list_memos(chat_id)
+    memos = await qs.list_memos(chat_id)
     if not memos:
         return '저장된 메모가 없습니다.'
 
@@ -92,6 +96,7 @@ async def list_memos(ctx: RunContext) -> str:
 
 
 @agent.tool
+@timed_tool
 async def delete_memo(
     ctx: RunContext,
     query: str,
@@ -104,18 +109,18 @@ async def delete_memo(
     from memory import qdrant_store as qs
     from memory.embeddings import embed_text
 
-    chat_id = ctx.deps
+    chat_id = ctx.deps.chat_id
     if not isinstance(chat_id, int):
         return '채팅 ID를 확인할 수 없습니다.'
 
     vector = await embed_text(query)
-    results = qs.search_memos(vector, chat_id, limit=1)
+    results = await qs.search_memos(vector, chat_id, limit=1)
 
     if not results or results[0].get('score', 0) < 0.3:
         return '삭제할 메모를 찾지 못했습니다.'
 
     target = results[0]
-    ok = qs.delete_memo(target['memo_id'])
+    ok = await qs.delete_memo(target['memo_id'])
     if ok:
         return f'메모 삭제 완료: "{target["content"]}"'
     return '메모 삭제에 실패했습니다.'
@@ -5,6 +5,7 @@ import logging
 import httpx
 
 from agent import agent
+from metrics import timed_tool
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,7 @@ _DEFAULT_LOCATION = '서울'
 
 
 @agent.tool_plain
+@timed_tool
 async def weather(location: str = '') -> str:
     """현재 날씨와 3일 예보를 조회합니다. 날씨 관련 질문에 사용하세요.
 
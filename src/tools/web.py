@@ -10,6 +10,7 @@ import httpx
 import trafilatura
 
 from agent import agent
+from metrics import timed, timed_tool
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +36,7 @@ def _random_headers() -> dict[str, str]:
     }
 
 
+@timed('stage', 'playwright')
 async def _fetch_with_playwright(url: str) -> str | None:
     """Playwright 헤드리스 크롬으로 페이지 렌더링 후 본문 추출."""
     try:
@@ -132,6 +134,7 @@ async def _naver_news_search(query: str) -> list[dict]:
 
 
 @agent.tool_plain
+@timed_tool
 async def search(query: str, read_content: bool = False) -> str:
     """웹 및 뉴스 통합 검색. read_content=True면 상위 결과 본문도 읽어옵니다."""
     logger.info('search tool called: query=%s, read_content=%s', query, read_content)
@@ -174,6 +177,7 @@ async def search(query: str, read_content: bool = False) -> str:
 
 
 @agent.tool_plain
+@timed_tool
 async def web_fetch(url: str) -> str:
     """웹페이지의 본문 텍스트를 추출합니다."""
     logger.info('web_fetch tool called: %s', url)
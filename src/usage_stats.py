@@ -0,0 +1,61 @@
+"""Per-turn prompt usage and vLLM prefix-cache hit rate.
+
+vLLM reports ``usage.prompt_tokens_details.cached_tokens`` when started with
+``--enable-prompt-tokens-details`` (docker-compose.yml); pydantic-ai surfaces
+it as ``cache_read_tokens``.  A turn's prefill is what the cache didn't cover:
+input_tokens - cache_read_tokens, summed over the turn's model requests.
+"""
+
+import logging
+from collections import deque
+
+from pydantic_ai.usage import RunUsage
+
+logger = logging.getLogger(__name__)
+
+TURN_SAMPLES = 1000
+
+
+class UsageStats:
+    def __init__(self) -> None:
+        self.turns = 0
+        self.requests = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self._prefill: deque[int] = deque(maxlen=TURN_SAMPLES)
+
+    def record(self, chat_id: int, usage: RunUsage) -> None:
+        prefill = usage.input_tokens - usage.cache_read_tokens
+        self.turns += 1
+        self.requests += usage.requests
+        self.input_tokens += usage.input_tokens
+        self.cached_tokens += usage.cache_read_tokens
+        self.output_tokens += usage.output_tokens
+        self._prefill.append(prefill)
+        logger.info(
+            'Chat %d turn: %d request(s), %d prompt tokens, %d cached (%.0f%%), %d prefilled, %d generated',
+            chat_id, usage.requests, usage.input_tokens, usage.cache_read_tokens,
+            100 * usage.cache_read_tokens / usage.input_tokens if usage.input_tokens else 0,
+            prefill, usage.output_tokens,
+        )
+
+    def stats(self) -> dict:
+        ordered = sorted(self._prefill)
+        return {
+            'turns': self.turns,
+            'requests': self.requests,
+            'input_tokens': self.input_tokens,
+            'cached_tokens': self.cached_tokens,
+            'output_tokens': self.output_tokens,
+            'cache_hit_rate': round(self.cached_tokens / self.input_tokens, 3) if self.input_tokens else 0.0,
+            'prefill_p50': ordered[len(ordered) // 2] if ordered else 0,
+            'prefill_p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else 0,
+        }
+
+
+_stats = UsageStats()
+
+
+def get_usage_stats() -> UsageStats:
+    return _stats